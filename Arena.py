@@ -0,0 +1,306 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+import q_learning
+
+
+def load_module(filename, name):
+    if name in sys.modules:
+        return sys.modules[name]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+PLAYER_START = q_learning.ROW_MASKS[0] | q_learning.ROW_MASKS[1]
+AI_START = q_learning.ROW_MASKS[6] | q_learning.ROW_MASKS[7]
+
+
+def flip_vertical(mask):
+    return int.from_bytes(mask.to_bytes(8, "little"), "big")
+
+
+def board_rows(player_mask, ai_mask):
+    return [['P' if player_mask >> (x * 8 + y) & 1 else 'p' if ai_mask >> (x * 8 + y) & 1 else '.'
+             for y in range(8)] for x in range(8)]
+
+
+# Every agent plays the AI side ('p', moving down the board): choose_move gets the position from
+# that side's point of view and returns (from, to) square indices, or None if it makes no move.
+# The arena flips the board vertically and swaps colours to seat an agent as the player.
+
+class RandomAgent:
+    def new_game(self, seed):
+        self.rng = random.Random(seed)
+
+    def choose_move(self, player_mask, ai_mask, moves_made):
+        return self.rng.choice(q_learning.generate_bitboard_moves(player_mask, ai_mask, 'p'))
+
+
+class TableDrivenAgent:
+    # The untouched class from "Table Driven Approach.py". make_move is replaced on the instance
+    # to record the move its ai_make_move picks instead of playing it.
+
+    def __init__(self):
+        module = load_module("Table Driven Approach.py", "table_driven_approach")
+        self.board = module.BreakthroughBoard()
+        self.board.make_move = self.record_move
+        self.move = None
+
+    def new_game(self, seed):
+        pass
+
+    def record_move(self, move_from, move_to):
+        self.move = (move_from, move_to)
+        return False
+
+    def choose_move(self, player_mask, ai_mask, moves_made):
+        board = self.board
+        board.board = board_rows(player_mask, ai_mask)
+        board.current_player = board.ai_piece
+        board.player_moves = moves_made
+        board.en_passant_target = None
+        self.move = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            board.ai_make_move()
+        if self.move is None:
+            return None
+        return q_learning.SQUARE_INDEX[self.move[0]], q_learning.SQUARE_INDEX[self.move[1]]
+
+
+class QLearningAgent(TableDrivenAgent):
+    # A BreakthroughBoard with learning off, optionally reading a trained Q-table file.
+
+    def __init__(self, q_table=None, exploration=0.0):
+        q_table = q_learning.MmapQTable(q_table) if q_table else None
+        self.board = q_learning.BreakthroughBoard(exploration_prob=float(exploration), headless=True,
+                                                  q_table=q_table)
+        self.board.learning = False
+        self.board.make_move = self.record_move
+        self.move = None
+
+    def new_game(self, seed):
+        self.board.rng = np.random.RandomState(seed)
+
+    def choose_move(self, player_mask, ai_mask, moves_made):
+        board = self.board
+        board.board = board_rows(player_mask, ai_mask)
+        board.sync_board()
+        board.current_player = board.ai_piece
+        board.player_moves = moves_made
+        board.en_passant_target = None
+        self.move = None
+        board.ai_make_move()
+        return self.move
+
+
+class SearchAgent:
+    def __init__(self, search):
+        self.search = search
+
+    def new_game(self, seed):
+        if isinstance(self.search, q_learning.MonteCarloTreeSearch):
+            self.search.rng = random.Random(seed)
+
+    def choose_move(self, player_mask, ai_mask, moves_made):
+        return self.search.search(player_mask, ai_mask, 'p')["move"]
+
+
+def make_agent(spec):
+    # "random", "table", "q[:q_table=PATH,exploration=0.1]", "alphabeta[:depth=3,seconds=1.0]"
+    # or "mcts[:playouts=500,seconds=1.0]".
+    kind, _, options = spec.partition(":")
+    options = dict(option.split("=", 1) for option in options.split(",") if option)
+    if kind == "random":
+        return RandomAgent()
+    if kind == "table":
+        return TableDrivenAgent()
+    if kind == "q":
+        return QLearningAgent(**options)
+    if kind == "alphabeta":
+        return SearchAgent(q_learning.AlphaBetaSearch(time_limit=float(options.get("seconds", 60.0)),
+                                                      max_depth=int(options.get("depth", 3))))
+    if kind == "mcts":
+        playouts = int(options["playouts"]) if "playouts" in options else None
+        return SearchAgent(q_learning.MonteCarloTreeSearch(playouts=playouts,
+                                                           time_limit=float(options.get("seconds", 1.0))))
+    raise ValueError(f"unknown agent {spec!r}")
+
+
+_agents = {}
+
+
+def cached_agent(spec):
+    if spec not in _agents:
+        _agents[spec] = make_agent(spec)
+    return _agents[spec]
+
+
+def play_game(job):
+    # Returns (score of the player-side agent, plies, how the game ended). The first opening_plies
+    # moves are random so that deterministic agents do not replay one game over and over.
+    player_spec, ai_spec, seed, opening_plies = job
+    agents = {'P': cached_agent(player_spec), 'p': cached_agent(ai_spec)}
+    for offset, agent in enumerate(agents.values()):
+        agent.new_game(seed * 2 + offset)
+    rng = random.Random(seed)
+    player_mask, ai_mask, piece, plies = PLAYER_START, AI_START, 'P', 0
+    while True:
+        opponent = 'p' if piece == 'P' else 'P'
+        moves = q_learning.generate_bitboard_moves(player_mask, ai_mask, piece)
+        if not moves:
+            return (piece == 'p') * 1.0, plies, "no moves"
+        if plies < opening_plies:
+            move = rng.choice(moves)
+        elif piece == 'p':
+            move = agents['p'].choose_move(player_mask, ai_mask, plies // 2 + 1)
+        else:
+            move = agents['P'].choose_move(flip_vertical(ai_mask), flip_vertical(player_mask), plies // 2 + 1)
+            move = None if move is None else (move[0] ^ 56, move[1] ^ 56)
+        if move is None or tuple(move) not in moves:
+            return (piece == 'p') * 1.0, plies, "illegal move" if move is not None else "no move chosen"
+        player_mask, ai_mask = q_learning.apply_bitboard_move(player_mask, ai_mask, piece, *move)
+        plies += 1
+        goal = q_learning.ROW_MASKS[7] if piece == 'P' else q_learning.ROW_MASKS[0]
+        if (1 << move[1]) & goal:
+            return (piece == 'P') * 1.0, plies, "goal"
+        piece = opponent
+
+
+def bradley_terry(wins, tolerance=1e-9, max_iterations=100):
+    # Elo ratings (mean 0) maximizing the likelihood of the win matrix, wins[i][j] = games i won
+    # against j, by Newton's method on the log-strengths. Every pairing that played also gets one
+    # virtual draw (half a win each way), so an undefeated or winless agent still has a finite
+    # rating and the iteration converges instead of drifting for as long as it runs.
+    played = (wins + wins.T) > 0
+    wins = wins + 0.5 * played
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+    log_strength = np.zeros(len(wins))
+    for _ in range(max_iterations):
+        probability = 1 / (1 + np.exp(log_strength[None, :] - log_strength[:, None]))
+        gradient = total_wins - (games * probability).sum(axis=1)
+        curvature = games * probability * (1 - probability)
+        hessian = np.diag(curvature.sum(axis=1)) - curvature
+        # The likelihood ignores a common shift; the minimum-norm step keeps the mean where it is.
+        step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+        log_strength += step
+        if np.abs(step).max() < tolerance:
+            break
+    return 400 / np.log(10) * (log_strength - log_strength.mean())
+
+
+def elo_with_intervals(wins, samples=1000, seed=0):
+    # Point estimates plus 95% intervals from a parametric bootstrap over each pairing's games,
+    # each resample rated by the same solver as the point estimate.
+    rng = np.random.default_rng(seed)
+    ratings = bradley_terry(wins)
+    games = wins + wins.T
+    rates = np.divide(wins, games, out=np.full_like(wins, 0.5, dtype=float), where=games > 0)
+    boot = []
+    for _ in range(samples):
+        upper = np.triu(rng.binomial(games.astype(np.int64), rates), 1)
+        resampled = upper + np.triu(games, 1).T - upper.T
+        boot.append(bradley_terry(resampled.astype(float)))
+    low, high = np.percentile(np.array(boot), [2.5, 97.5], axis=0)
+    return ratings, low, high
+
+
+def schedule(specs, mode, games, opening_plies, seed):
+    if mode == "gauntlet":
+        pairs = [(0, other) for other in range(1, len(specs))]
+    else:
+        pairs = list(itertools.combinations(range(len(specs)), 2))
+    jobs = []
+    for pair_index, (first, second) in enumerate(pairs):
+        for game in range(games):
+            # Colours alternate, and both colourings of a pairing share their random openings.
+            player, ai = (first, second) if game % 2 == 0 else (second, first)
+            game_seed = seed + (pair_index * games + game // 2) * 2
+            jobs.append(((player, ai), (specs[player], specs[ai], game_seed, opening_plies)))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Breakthrough agents against each other and rate them.")
+    parser.add_argument("agents", nargs="+", help="agent specs, e.g. table, q:q_table=qtable.bin, alphabeta:depth=2")
+    parser.add_argument("--mode", choices=("round-robin", "gauntlet"), default="round-robin",
+                        help="gauntlet plays the first agent against each of the others")
+    parser.add_argument("--games", type=int, default=200, help="games per pairing, colours alternating")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves played at the start of each game")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    specs = args.agents
+    jobs = schedule(specs, args.mode, args.games, args.opening_plies, args.seed)
+    wins = np.zeros((len(specs), len(specs)))
+    endings = {}
+    plies = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        chunksize = max(1, len(jobs) // (8 * (args.workers or os.cpu_count() or 1)))
+        outcomes = pool.map(play_game, [job for _, job in jobs], chunksize=chunksize)
+    seconds = time.perf_counter() - start
+    for ((player, ai), _), (player_score, game_plies, ending) in zip(jobs, outcomes):
+        winner, loser = (player, ai) if player_score else (ai, player)
+        wins[winner, loser] += 1
+        endings[ending] = endings.get(ending, 0) + 1
+        plies += game_plies
+
+    ratings, low, high = elo_with_intervals(wins, seed=args.seed)
+    games = wins + wins.T
+    report = {
+        "games": len(jobs),
+        "seconds": seconds,
+        "games_per_second": len(jobs) / seconds if seconds > 0 else 0.0,
+        "average_plies": plies / len(jobs) if jobs else 0.0,
+        "endings": endings,
+        "agents": [{
+            "agent": spec,
+            "games": int(games[index].sum()),
+            "score": wins[index].sum() / games[index].sum() if games[index].sum() else 0.0,
+            "elo": float(ratings[index]),
+            "elo_low": float(low[index]),
+            "elo_high": float(high[index]),
+        } for index, spec in enumerate(specs)],
+        "pairings": [{
+            "agent": specs[first],
+            "opponent": specs[second],
+            "games": int(games[first, second]),
+            "score": wins[first, second] / games[first, second],
+        } for first, second in itertools.combinations(range(len(specs)), 2) if games[first, second]],
+    }
+
+    width = max(len(spec) for spec in specs)
+    print(f"{'agent':<{width}} {'games':>6} {'score':>6} {'elo':>7} {'95% interval':>17}")
+    for row in sorted(report["agents"], key=lambda row: -row["elo"]):
+        interval = f"[{row['elo_low']:.0f}, {row['elo_high']:.0f}]"
+        print(f"{row['agent']:<{width}} {row['games']:>6} {row['score']:>6.3f} {row['elo']:>7.0f} {interval:>17}")
+    for row in report["pairings"]:
+        print(f"{row['agent']} vs {row['opponent']}: {row['score']:.3f} over {row['games']} games")
+    print(f"{report['games']} games in {seconds:.1f}s ({report['games_per_second']:.1f} games/s), "
+          f"average {report['average_plies']:.1f} plies, endings {endings}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+            handle.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import q_learning
+
+
+# Positions are written rank 8 first, like display_board, followed by the side to move and the
+# en passant target square. Node counts come from the original string-grid is_valid_move rules:
+# leaf positions at exactly that depth, with a game ending as soon as a pawn reaches its last row.
+PERFT_POSITIONS = [
+    ("initial", "pppppppp/pppppppp/8/8/8/8/PPPPPPPP/PPPPPPPP P -",
+     {1: 16, 2: 256, 3: 4230, 4: 69864, 5: 1181272}),
+    ("two-square-player", "4p3/8/8/8/8/2p5/1P6/P1P1P3 P -",
+     {1: 8, 2: 27, 3: 177, 4: 460, 5: 2279}),
+    ("two-square-ai", "p1p1p3/1p6/5P2/8/8/8/8/4P3 p -",
+     {1: 8, 2: 25, 3: 191, 4: 561, 5: 3268}),
+    ("en-passant-ai", "8/p7/8/3pP3/8/8/2P5/8 p e6",
+     {1: 4, 2: 11, 3: 36, 4: 73, 5: 179}),
+    ("en-passant-player", "8/pp6/8/8/2P5/8/8/8 P d3",
+     {1: 2, 2: 8, 3: 9, 4: 29, 5: 28}),
+    ("midgame", "pp1p1ppp/2p1p3/1p3p2/3P4/P3p3/2P2P2/1P1P2PP/PP1PP1P1 P -",
+     {1: 17, 2: 305, 3: 5107, 4: 88761, 5: 1464013}),
+    ("endgame", "8/2p5/8/1P6/5p2/8/3P4/8 p -",
+     {1: 3, 2: 10, 3: 26, 4: 66, 5: 148}),
+]
+
+
+def parse_position(text):
+    ranks, piece, en_passant = text.split()
+    player_mask = ai_mask = 0
+    for rank_index, rank in enumerate(ranks.split('/')):
+        row = 7 - rank_index
+        col = 0
+        for symbol in rank:
+            if symbol.isdigit():
+                col += int(symbol)
+                continue
+            if symbol == 'P':
+                player_mask |= 1 << (row * 8 + col)
+            elif symbol == 'p':
+                ai_mask |= 1 << (row * 8 + col)
+            col += 1
+    return player_mask, ai_mask, piece, None if en_passant == '-' else q_learning.SQUARE_INDEX[en_passant]
+
+
+def benchmark_board(player_mask, ai_mask, piece, en_passant):
+    board = q_learning.BreakthroughBoard(headless=True)
+    for square in range(64):
+        x, y = divmod(square, 8)
+        board.board[x][y] = 'P' if player_mask >> square & 1 else 'p' if ai_mask >> square & 1 else '.'
+    board.sync_board()
+    board.current_player = piece
+    board.en_passant_target = q_learning.SQUARE_NAMES[en_passant] if en_passant is not None else None
+    return board
+
+
+def clone_board(board):
+    # The RNG is the np.random module and the Q-table is shared, so neither is copied.
+    return copy.deepcopy(board, {id(board.rng): board.rng, id(board.q_table): board.q_table})
+
+
+def perft_bitboard(player_mask, ai_mask, piece, en_passant, depth):
+    moves = q_learning.generate_bitboard_moves(player_mask, ai_mask, piece, en_passant)
+    if depth == 1:
+        return len(moves)
+    goal = q_learning.ROW_MASKS[7] if piece == 'P' else q_learning.ROW_MASKS[0]
+    opponent = 'p' if piece == 'P' else 'P'
+    nodes = 0
+    for move_from, move_to in moves:
+        if (1 << move_to) & goal:
+            continue
+        new_player_mask, new_ai_mask = q_learning.apply_bitboard_move(player_mask, ai_mask, piece, move_from, move_to)
+        nodes += perft_bitboard(new_player_mask, new_ai_mask, opponent, en_passant, depth - 1)
+    return nodes
+
+
+def perft_batch(player_mask, ai_mask, piece, en_passant, depth):
+    if en_passant is not None:
+        return None
+    batch = q_learning.BatchBreakthrough(1)
+    batch.player_masks[0] = player_mask
+    batch.ai_masks[0] = ai_mask
+    batch.ai_to_move[0] = piece == 'p'
+    for _ in range(depth):
+        games, actions = np.nonzero(batch.legal_actions())
+        children = q_learning.BatchBreakthrough(len(games))
+        children.player_masks[:] = batch.player_masks[games]
+        children.ai_masks[:] = batch.ai_masks[games]
+        children.ai_to_move[:] = batch.ai_to_move[games]
+        children.step(actions)
+        batch = children
+    return batch.games
+
+
+def perft_board(player_mask, ai_mask, piece, en_passant, depth):
+    board = benchmark_board(player_mask, ai_mask, piece, en_passant)
+
+    def count(depth):
+        moves = board.get_legal_moves(board.current_player)
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            board.push(move)
+            if board.winner() is None:
+                nodes += count(depth - 1)
+            board.pop()
+        return nodes
+    return count(depth)
+
+
+PERFT_ENGINES = {
+    "bitboard": perft_bitboard,
+    "batch": perft_batch,
+    "board": perft_board,
+}
+
+
+def run_perft(max_depth, engines):
+    results = []
+    for name, text, expected in PERFT_POSITIONS:
+        position = parse_position(text)
+        for depth in range(1, max_depth + 1):
+            if depth not in expected:
+                continue
+            for engine in engines:
+                start = time.perf_counter()
+                nodes = PERFT_ENGINES[engine](*position, depth)
+                seconds = time.perf_counter() - start
+                if nodes is None:
+                    continue
+                results.append({
+                    "position": name,
+                    "depth": depth,
+                    "engine": engine,
+                    "nodes": nodes,
+                    "expected": expected[depth],
+                    "ok": nodes == expected[depth],
+                    "seconds": seconds,
+                    "nodes_per_second": nodes / seconds if seconds > 0 else 0.0,
+                })
+    return results
+
+
+def time_per_call(function, setups, repeat=3):
+    # Best-of-repeat microseconds per call; setups is a list of argument tuples, one per call,
+    # built before the clock starts so copying boards is not measured.
+    best = float('inf')
+    for _ in range(repeat):
+        arguments = setups()
+        start = time.perf_counter()
+        for args in arguments:
+            function(*args)
+        best = min(best, (time.perf_counter() - start) / len(arguments))
+    return best * 1e6
+
+
+def run_timings(calls):
+    board = benchmark_board(*parse_position(PERFT_POSITIONS[5][1]))
+    ai_board = clone_board(board)
+    ai_board.current_player = 'p'
+    player_move = board.get_legal_moves('P')[0]
+    from_x, from_y = board.square_to_coordinates(player_move[0])
+    to_x, to_y = board.square_to_coordinates(player_move[1])
+    player_mask, ai_mask = board.bitboards['P'], board.bitboards['p']
+    single = [()] * calls
+
+    def boards(source, count):
+        return lambda: [(clone_board(source),) for _ in range(count)]
+
+    timings = {
+        "get_valid_moves": time_per_call(board.get_valid_moves, lambda: single),
+        "get_legal_moves": time_per_call(lambda: board.get_legal_moves('P'), lambda: single),
+        "is_valid_move": time_per_call(board.is_valid_move, lambda: [(from_x, from_y, to_x, to_y, 'P')] * calls),
+        "generate_bitboard_moves": time_per_call(
+            q_learning.generate_bitboard_moves, lambda: [(player_mask, ai_mask, 'P')] * calls),
+        "get_state_representation": time_per_call(board.get_state_representation, lambda: single),
+        "push_pop": time_per_call(lambda: (board.push(player_move), board.pop()), lambda: single),
+        "make_move": time_per_call(lambda b: b.make_move(*player_move), boards(board, max(1, calls // 10))),
+        "ai_make_move": time_per_call(lambda b: b.ai_make_move(), boards(ai_board, max(1, calls // 10))),
+    }
+    return {name: {"microseconds_per_call": value} for name, value in timings.items()}
+
+
+def run_engines(games, search_seconds):
+    board = q_learning.BreakthroughBoard()
+    self_play = board.simulate_games(games, seed=0)
+    del self_play["results"]
+    replay_board = q_learning.BreakthroughBoard(replay_buffer=q_learning.ReplayBuffer(seed=0))
+    replay_self_play = replay_board.simulate_games(games, seed=0)
+    del replay_self_play["results"]
+    batch = q_learning.BatchBreakthrough(4096, seed=0).play_random_games(games * 20)
+    player_mask, ai_mask, piece, _ = parse_position(PERFT_POSITIONS[0][1])
+    search = q_learning.AlphaBetaSearch(time_limit=search_seconds)
+    search_info = search.search(player_mask, ai_mask, piece)
+    mcts = q_learning.MonteCarloTreeSearch(time_limit=search_seconds, seed=0)
+    mcts_info = mcts.search(player_mask, ai_mask, piece)
+    return {
+        "self_play": self_play,
+        "replay_self_play": replay_self_play,
+        "batch_random_play": batch,
+        "alpha_beta": {key: value for key, value in search_info.items() if key != "move"},
+        "mcts": {key: value for key, value in mcts_info.items() if key != "move"},
+    }
+
+
+def run_smp_scaling(worker_counts, search_seconds):
+    # Average completed depth and node rate of LazySMPSearch at a fixed time per move, over the
+    # initial, midgame and endgame positions.
+    positions = [parse_position(PERFT_POSITIONS[index][1]) for index in (0, 5, 6)]
+    scaling = []
+    for workers in worker_counts:
+        with q_learning.LazySMPSearch(workers=workers, time_limit=search_seconds) as search:
+            infos = [search.search(*position) for position in positions]
+        scaling.append({
+            "workers": workers,
+            "average_depth": sum(info["depth"] for info in infos) / len(infos),
+            "depths": [info["depth"] for info in infos],
+            "nodes_per_second": sum(info["nodes"] for info in infos) / sum(info["seconds"] for info in infos),
+        })
+    return scaling
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft checks and speed benchmarks for the Breakthrough engines.")
+    parser.add_argument("--depth", type=int, default=4, help="deepest perft depth to run (1-5)")
+    parser.add_argument("--engines", default=",".join(PERFT_ENGINES), help="comma-separated perft engines")
+    parser.add_argument("--calls", type=int, default=2000, help="calls per micro-benchmark")
+    parser.add_argument("--games", type=int, default=200, help="self-play games for the end-to-end benchmark")
+    parser.add_argument("--search-seconds", type=float, default=1.0, help="time budget for the search benchmarks")
+    parser.add_argument("--smp-workers", default="1,2,4,8,16",
+                        help="comma-separated worker counts for the parallel search scaling run ('' to skip)")
+    parser.add_argument("--json", help="write the results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "perft": run_perft(args.depth, args.engines.split(",")),
+        "timings": run_timings(args.calls),
+        "engines": run_engines(args.games, args.search_seconds),
+        "smp_scaling": run_smp_scaling([int(count) for count in args.smp_workers.split(",") if count],
+                                       args.search_seconds),
+    }
+    failures = [result for result in report["perft"] if not result["ok"]]
+    report["perft_ok"] = not failures
+    for result in failures:
+        print(f"perft mismatch: {result['engine']} {result['position']} depth {result['depth']}: "
+              f"{result['nodes']} != {result['expected']}", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import argparse
+import sys
+import time
+
+import q_learning
+
+
+def q_table_move(q_table, key, moves):
+    # The move with the highest learned value, or None when the Q-table knows nothing here.
+    values = [q_table.get((key, move), 0.0) for move in moves]
+    if not any(values):
+        return None
+    return moves[values.index(max(values))]
+
+
+def build_book(ai_moves, seconds, max_depth, q_table=None, progress=True):
+    # Walks every player reply from the initial position, choosing one AI move per position, for
+    # ai_moves AI turns. Transpositions are analysed once because the book is keyed by hash.
+    book = q_learning.OpeningBook()
+    search = q_learning.AlphaBetaSearch(time_limit=seconds, max_depth=max_depth)
+    board = q_learning.BreakthroughBoard(headless=True)
+    frontier = [(board.bitboards['P'], board.bitboards['p'])]
+    goal_rows = q_learning.ROW_MASKS[7] | q_learning.ROW_MASKS[0]
+    start = time.perf_counter()
+    for turn in range(ai_moves):
+        next_frontier = []
+        for player_mask, ai_mask in frontier:
+            for move_from, move_to in q_learning.generate_bitboard_moves(player_mask, ai_mask, 'P'):
+                after_player = q_learning.apply_bitboard_move(player_mask, ai_mask, 'P', move_from, move_to)
+                key = q_learning.position_key(*after_player, 'p')
+                if (1 << move_to) & goal_rows or key in book:
+                    continue
+                moves = q_learning.generate_bitboard_moves(*after_player, 'p')
+                if not moves:
+                    continue
+                move = q_table_move(q_table, key, moves) if q_table is not None else None
+                if move is None:
+                    move = search.search(*after_player, 'p')["move"]
+                book.add(key, move)
+                after_ai = q_learning.apply_bitboard_move(*after_player, 'p', *move)
+                if not (1 << move[1]) & goal_rows:
+                    next_frontier.append(after_ai)
+        frontier = next_frontier
+        if progress:
+            print(f"AI move {turn + 1}: {len(book)} positions, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return book
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book for the Breakthrough AI.")
+    parser.add_argument("output", help="book file to write")
+    parser.add_argument("--ai-moves", type=int, default=2, help="AI turns covered by the book")
+    parser.add_argument("--seconds", type=float, default=1.0, help="search time per book position")
+    parser.add_argument("--max-depth", type=int, default=64, help="search depth limit per book position")
+    parser.add_argument("--q-table", help="prefer moves from this trained Q-table where it has values")
+    args = parser.parse_args()
+    q_table = q_learning.MmapQTable(args.q_table) if args.q_table else None
+    book = build_book(args.ai_moves, args.seconds, args.max_depth, q_table)
+    book.save(args.output)
+    print(f"wrote {len(book)} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+import q_learning
+
+
+COMBINATIONS = np.array([[math.comb(n, k) for k in range(9)] for n in range(57)], dtype=np.int64)
+NO_WIN = 1 << 30
+
+
+class PawnSets:
+    # Every placement of `count` pawns for one side, indexed by combinatorial rank as in
+    # q_learning.tablebase_index. Player pawns live on squares 0-55, AI pawns on 8-63.
+
+    def __init__(self, count, piece):
+        self.count = count
+        self.base = 0 if piece == 'P' else 8
+        combos = list(itertools.combinations(range(56), count))
+        combos = np.array(combos, dtype=np.int64).reshape(len(combos), count)
+        ranks = rank_rows(combos)
+        self.squares = np.empty_like(combos)
+        self.squares[ranks] = combos + self.base
+        self.masks = np.zeros(len(combos), dtype=np.uint64)
+        for column in range(count):
+            self.masks |= np.uint64(1) << self.squares[:, column].astype(np.uint64)
+        rows = self.squares >> 3
+        progress = rows.sum(axis=1) if piece == 'P' else (7 - rows).sum(axis=1)
+        self.by_progress = {int(value): np.flatnonzero(progress == value) for value in np.unique(progress)}
+
+    def __len__(self):
+        return len(self.masks)
+
+
+def rank_rows(squares):
+    # Ranks of sorted rows of 0-55 square numbers.
+    rank = np.zeros(len(squares), dtype=np.int64)
+    for column in range(squares.shape[1]):
+        rank += COMBINATIONS[squares[:, column], column + 1]
+    return rank
+
+
+def solve_side(tables, pawn_sets, player_pawns, ai_pawns, piece, player_ranks, ai_ranks):
+    player_squares = pawn_sets['P', player_pawns].squares[player_ranks]
+    ai_squares = pawn_sets['p', ai_pawns].squares[ai_ranks]
+    occupied = pawn_sets['P', player_pawns].masks[player_ranks] | pawn_sets['p', ai_pawns].masks[ai_ranks]
+    if piece == 'P':
+        movers, opponents, opponent_ranks = player_squares, ai_squares, ai_ranks
+        forward, goal_row, start_rows, mover_base = 8, 7, (0, 1), 0
+        opponent_masks = pawn_sets['p', ai_pawns].masks[ai_ranks]
+    else:
+        movers, opponents, opponent_ranks = ai_squares, player_squares, player_ranks
+        forward, goal_row, start_rows, mover_base = -8, 0, (6, 7), 8
+        opponent_masks = pawn_sets['P', player_pawns].masks[player_ranks]
+    opponent_piece = 'p' if piece == 'P' else 'P'
+    opponent_base = 8 - mover_base
+    win = np.full(len(movers), NO_WIN, dtype=np.int64)
+    loss = np.zeros(len(movers), dtype=np.int64)
+    for column in range(movers.shape[1]):
+        origin = movers[:, column]
+        row, col = origin >> 3, origin & 7
+        for kind in ("forward", "left", "right", "double"):
+            if kind == "forward":
+                target = origin + forward
+                legal = np.ones(len(origin), dtype=bool)
+            elif kind == "left":
+                target = origin + forward - 1
+                legal = col > 0
+            elif kind == "right":
+                target = origin + forward + 1
+                legal = col < 7
+            else:
+                target = origin + 2 * forward
+                middle = origin + forward
+                legal = (row == start_rows[0]) | (row == start_rows[1])
+                legal &= ((occupied >> np.clip(middle, 0, 63).astype(np.uint64)) & np.uint64(1)) == 0
+            bits = np.uint64(1) << np.clip(target, 0, 63).astype(np.uint64)
+            capture = kind in ("left", "right")
+            if capture:
+                legal &= (opponent_masks & bits) != 0
+            else:
+                legal &= (occupied & bits) == 0
+            win[legal & (target >> 3 == goal_row)] = 1
+            rest = np.flatnonzero(legal & (target >> 3 != goal_row))
+            if not len(rest):
+                continue
+            new_movers = movers[rest].copy()
+            new_movers[:, column] = target[rest]
+            new_movers.sort(axis=1)
+            new_mover_ranks = rank_rows(new_movers - mover_base)
+            if capture:
+                kept = opponents[rest] != target[rest, None]
+                new_opponents = opponents[rest][kept].reshape(len(rest), -1)
+                new_opponent_ranks = rank_rows(new_opponents - opponent_base)
+                opponent_count = opponents.shape[1] - 1
+            else:
+                new_opponent_ranks = opponent_ranks[rest]
+                opponent_count = opponents.shape[1]
+            if piece == 'P':
+                key = (player_pawns, opponent_count, opponent_piece)
+                index = new_mover_ranks * math.comb(56, opponent_count) + new_opponent_ranks
+            else:
+                key = (opponent_count, ai_pawns, opponent_piece)
+                index = new_opponent_ranks * math.comb(56, ai_pawns) + new_mover_ranks
+            values = tables[key][index].astype(np.int64)
+            if (values == 0).any():
+                raise RuntimeError(f"unsolved successor in {key}")
+            losing = values < 0
+            np.minimum.at(win, rest[losing], -values[losing])
+            np.maximum.at(loss, rest[~losing], values[~losing] + 1)
+    result = np.where(win < NO_WIN, win, -1 - loss)
+    if np.abs(result).max(initial=0) > 127:
+        raise OverflowError("distance does not fit in int8")
+    return result.astype(np.int8)
+
+
+def build_tablebase(max_pawns, progress=True):
+    # Every move either captures (fewer pawns: an earlier, already solved table) or advances a
+    # pawn, raising the position's total advancement. Solving each material split from the most
+    # advanced positions backwards therefore finds every successor already solved.
+    pawn_sets = {}
+    for count in range(max_pawns + 1):
+        pawn_sets['P', count] = PawnSets(count, 'P')
+        pawn_sets['p', count] = PawnSets(count, 'p')
+    tables = {}
+    start = time.perf_counter()
+    for player_pawns, ai_pawns in q_learning.tablebase_materials(max_pawns):
+        players, ais = pawn_sets['P', player_pawns], pawn_sets['p', ai_pawns]
+        for piece in ('P', 'p'):
+            tables[player_pawns, ai_pawns, piece] = np.zeros(len(players) * len(ais), dtype=np.int8)
+        for level in range(6 * (player_pawns + ai_pawns), -1, -1):
+            pairs = [(player_group, ais.by_progress[level - player_level])
+                     for player_level, player_group in players.by_progress.items()
+                     if level - player_level in ais.by_progress]
+            if not pairs:
+                continue
+            player_ranks = np.concatenate([np.repeat(group, len(other)) for group, other in pairs])
+            ai_ranks = np.concatenate([np.tile(other, len(group)) for group, other in pairs])
+            disjoint = (players.masks[player_ranks] & ais.masks[ai_ranks]) == 0
+            player_ranks, ai_ranks = player_ranks[disjoint], ai_ranks[disjoint]
+            index = player_ranks * len(ais) + ai_ranks
+            for piece in ('P', 'p'):
+                tables[player_pawns, ai_pawns, piece][index] = solve_side(
+                    tables, pawn_sets, player_pawns, ai_pawns, piece, player_ranks, ai_ranks)
+        if progress:
+            print(f"{player_pawns}P v {ai_pawns}p: {len(players) * len(ais)} positions per side, "
+                  f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return tables
+
+
+def save_tablebase(tables, max_pawns, path):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as handle:
+        handle.write(q_learning.TABLEBASE_HEADER.pack(q_learning.TABLEBASE_MAGIC, 1, max_pawns))
+        for player_pawns, ai_pawns in q_learning.tablebase_materials(max_pawns):
+            for piece in ('P', 'p'):
+                handle.write(tables[player_pawns, ai_pawns, piece].tobytes())
+    os.replace(temporary_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve every Breakthrough position with few pawns left.")
+    parser.add_argument("output", help="tablebase file to write")
+    parser.add_argument("--max-pawns", type=int, default=4, help="total pawns on the board, both sides (up to 8)")
+    args = parser.parse_args()
+    tables = build_tablebase(args.max_pawns)
+    save_tablebase(tables, args.max_pawns, args.output)
+    print(f"wrote {sum(len(table) for table in tables.values())} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,1607 @@
 import numpy as np
+import functools
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import struct
 import sys
+import time
 sys.tracebacklimit = 0
 
+FULL_MASK = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+ROW_MASKS = [0xFF << (8 * row) for row in range(8)]
+SQUARE_NAMES = [chr(col + ord('a')) + str(row + 1) for row in range(8) for col in range(8)]
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+
+def rotate_halves(value):
+    return ((value << 32) | (value >> 32)) & FULL_MASK
+
+
+def make_zobrist_keys(seed=20231):
+    # Keys for mirrored squares are each other's 32-bit rotation and the side-to-move key is
+    # rotation-invariant, so the hash of a position's mirror image is rotate_halves(hash).
+    rng = random.Random(seed)
+    keys = {}
+    for piece in ('P', 'p'):
+        piece_keys = [0] * 64
+        for square in range(64):
+            if square & 7 < 4:
+                piece_keys[square] = rng.getrandbits(64)
+                piece_keys[square ^ 7] = rotate_halves(piece_keys[square])
+        keys[piece] = piece_keys
+    half = rng.getrandbits(32)
+    return keys, (half << 32) | half
+
+
+ZOBRIST_KEYS, SIDE_TO_MOVE_KEY = make_zobrist_keys()
+
+
+def square_bits(squares):
+    mask = 0
+    for square in squares:
+        mask |= 1 << square
+    return mask
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def build_move_tables(piece):
+    # Per square, for one side: the square one step forward, the diagonal capture squares
+    # (towards col + 1 first), the two-square target with the square it passes over, and the
+    # en passant capture squares. None or () where a pawn there cannot make that move.
+    step = 8 if piece == 'P' else -8
+    start_rows = (0, 1) if piece == 'P' else (6, 7)
+    en_passant_row = 3 if piece == 'P' else 4
+    forward, captures, double_steps, en_passant = [], [], [], []
+    for square in range(64):
+        row, col = square >> 3, square & 7
+        target = square + step
+        on_board = 0 <= target < 64
+        sides = [offset for offset, edge in ((1, 7), (-1, 0)) if col != edge]
+        forward.append(target if on_board else None)
+        captures.append(tuple(target + offset for offset in sides) if on_board else ())
+        double_steps.append((target + step, target) if row in start_rows else None)
+        en_passant.append(tuple(square - step + offset for offset in sides) if row == en_passant_row else ())
+    return forward, captures, double_steps, en_passant
+
+
+MOVE_TABLES = {piece: build_move_tables(piece) for piece in ('P', 'p')}
+FORWARD_TARGETS = {piece: tables[0] for piece, tables in MOVE_TABLES.items()}
+CAPTURE_TARGETS = {piece: tables[1] for piece, tables in MOVE_TABLES.items()}
+DOUBLE_STEPS = {piece: tables[2] for piece, tables in MOVE_TABLES.items()}
+EN_PASSANT_TARGETS = {piece: tables[3] for piece, tables in MOVE_TABLES.items()}
+CAPTURE_MASKS = {piece: [square_bits(targets) for targets in CAPTURE_TARGETS[piece]] for piece in ('P', 'p')}
+
+
+ROW_MOVES_CACHE_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=ROW_MOVES_CACHE_SIZE)
+def row_moves(piece, base, *kinds):
+    # The moves of two rows, given each kind's (forward, right, left, double) origin bits for the
+    # 16 squares from square `base` on. Row patterns repeat constantly, so the most recently used
+    # ones are kept expanded; the bound keeps long training runs from growing the cache forever.
+    step = 8 if piece == 'P' else -8
+    moves = []
+    for offset in range(16):
+        square = base + offset
+        target = square + step
+        for bits, target_offset in zip(kinds, (0, 1, -1, step)):
+            if bits >> offset & 1:
+                moves.append((square, target + target_offset))
+    return tuple(moves)
+
+
+def generate_bitboard_moves(player_mask, ai_mask, piece, en_passant=None, double_steps=True):
+    # Moves are (from_square, to_square) pairs of 0-63 indices (row * 8 + col), ordered by
+    # from square, then forward, capture towards col + 1, capture towards col - 1,
+    # two-square move and en passant, which is the order get_valid_moves has always used.
+    empty = ~(player_mask | ai_mask) & FULL_MASK
+    if piece == 'P':
+        own = player_mask
+        step = 8
+        forward = ((own << 8) & empty) >> 8
+        right = ((((own & ~FILE_H) << 9) & ai_mask) >> 9)
+        left = ((((own & ~FILE_A) << 7) & ai_mask) >> 7)
+        double = (((((own & (ROW_MASKS[0] | ROW_MASKS[1])) << 8) & empty) << 8) & empty) >> 16 if double_steps else 0
+        en_passant_row = 2
+    else:
+        own = ai_mask
+        step = -8
+        forward = ((own >> 8) & empty) << 8
+        right = ((((own & ~FILE_H) >> 7) & player_mask) << 7)
+        left = ((((own & ~FILE_A) >> 9) & player_mask) << 9)
+        double = (((((own & (ROW_MASKS[6] | ROW_MASKS[7])) >> 8) & empty) >> 8) & empty) << 16 if double_steps else 0
+        en_passant_row = 5
+    # forward, right, left and double now hold the origin squares of each kind of move. Each pair of
+    # rows holding an origin gets its moves whole from row_moves, keyed by those rows' bits of
+    # each mask.
+    en_passant_origins = 0
+    if en_passant is not None and en_passant >> 3 == en_passant_row:
+        source = en_passant + step
+        col = en_passant & 7
+        if col > 0:
+            en_passant_origins |= 1 << (source - 1)
+        if col < 7:
+            en_passant_origins |= 1 << (source + 1)
+        en_passant_origins &= own
+    origins = forward | right | left | double
+    moves = []
+    while origins:
+        shift = (origins & -origins).bit_length() - 1 & ~15
+        origins &= ~(0xFFFF << shift)
+        moves += row_moves(piece, shift, forward >> shift & 0xFFFF, right >> shift & 0xFFFF,
+                           left >> shift & 0xFFFF, double >> shift & 0xFFFF)
+    if en_passant_origins:
+        # En passant is a last move for its origin square; it never happens in played games.
+        for square in iter_bits(en_passant_origins):
+            index = next((index for index, move in enumerate(moves) if move[0] > square), len(moves))
+            moves.insert(index, (square, en_passant))
+    return moves
+
+
+def pawn_target_mask(square, piece, player_mask, ai_mask, en_passant=None):
+    occupied = player_mask | ai_mask
+    targets = CAPTURE_MASKS[piece][square] & (ai_mask if piece == 'P' else player_mask)
+    forward = FORWARD_TARGETS[piece][square]
+    if forward is not None and not occupied >> forward & 1:
+        targets |= 1 << forward
+        double_step = DOUBLE_STEPS[piece][square]
+        if double_step is not None and not occupied >> double_step[0] & 1:
+            targets |= 1 << double_step[0]
+    if en_passant is not None and en_passant in EN_PASSANT_TARGETS[piece][square]:
+        targets |= 1 << en_passant
+    return targets
+
+def apply_bitboard_move(player_mask, ai_mask, piece, move_from, move_to):
+    # Same board effect as update_board_and_check_win, including the en passant removal on row 5.
+    from_bit = 1 << move_from
+    to_bit = 1 << move_to
+    if piece == 'P':
+        return (player_mask & ~from_bit) | to_bit, ai_mask & ~to_bit
+    if move_from >> 3 == 4 and move_to >> 3 == 5:
+        captured = ~(1 << (32 + (move_to & 7)))
+        player_mask &= captured
+        ai_mask &= captured
+    return player_mask & ~to_bit, (ai_mask & ~from_bit) | to_bit
+
+
+def update_zobrist(key, player_mask, ai_mask, new_player_mask, new_ai_mask):
+    key ^= SIDE_TO_MOVE_KEY
+    for piece, changed in (('P', player_mask ^ new_player_mask), ('p', ai_mask ^ new_ai_mask)):
+        while changed:
+            low = changed & -changed
+            key ^= ZOBRIST_KEYS[piece][low.bit_length() - 1]
+            changed ^= low
+    return key
+
+
+def position_key(player_mask, ai_mask, piece):
+    key = SIDE_TO_MOVE_KEY if piece == 'p' else 0
+    for square in iter_bits(player_mask):
+        key ^= ZOBRIST_KEYS['P'][square]
+    for square in iter_bits(ai_mask):
+        key ^= ZOBRIST_KEYS['p'][square]
+    return key
+
+
+WIN_SCORE = 100000
+ROW_VALUES = [100, 100, 104, 110, 120, 135, 160, 0]
+
+
+def evaluate_position(player_mask, ai_mask, piece):
+    # Material plus advancement, from the point of view of the side to move.
+    score = 0
+    for row in range(8):
+        score += ROW_VALUES[row] * (player_mask & ROW_MASKS[row]).bit_count()
+        score -= ROW_VALUES[7 - row] * (ai_mask & ROW_MASKS[row]).bit_count()
+    return score if piece == 'P' else -score
+
+
+def mirror_state(state):
+    if isinstance(state, int):
+        return rotate_halves(state)
+    return "".join(state[row:row + 8][::-1] for row in range(0, 64, 8))
+
+
+def mirror_action(action):
+    return action[0] ^ 7, action[1] ^ 7
+
+
+STATE_TO_PLAYER_BITS = str.maketrans({'P': '1', 'p': '0', '.': '0'})
+STATE_TO_AI_BITS = str.maketrans({'P': '0', 'p': '1', '.': '0'})
+NO_ACTION = 255
+Q_TABLE_MAGIC = b"BTQTABLE"
+Q_TABLE_VERSION = 3
+Q_TABLE_HEADER = struct.Struct("<8sIIQQ")
+Q_TABLE_HEADER_SIZE = 64
+OPENING_BOOK_MAGIC = b"BTOPENBK"
+OPENING_BOOK_HEADER = struct.Struct("<8sIQ")
+GAME_RECORD_MAGIC = b"BTGAMES1"
+GAME_RECORD_HEADER = struct.Struct("<HB")
+TABLEBASE_MAGIC = b"BTENDGTB"
+TABLEBASE_HEADER = struct.Struct("<8sII")
+
+
+def encode_state(state):
+    # A 64-character state string packs into (player_mask << 64) | ai_mask; integer keys pass through.
+    if isinstance(state, int):
+        return state
+    player_mask = int(state.translate(STATE_TO_PLAYER_BITS)[::-1], 2)
+    ai_mask = int(state.translate(STATE_TO_AI_BITS)[::-1], 2)
+    return (player_mask << 64) | ai_mask
+
+
+def encode_action(action):
+    # Actions are from_square * 3 + direction, direction 0/1/2 for a column change of -1/0/+1.
+    # A two-square move takes a slot of the mover's goal row, whose pawns never move again: the
+    # player's (moving up) 168 + from_square, the AI's (moving down) from_square - 48. The state
+    # key includes the side to move, so those slots are free in any state where this move exists.
+    if isinstance(action, int):
+        return action
+    move_from, move_to = action
+    if move_to - move_from == 16:
+        return 168 + move_from
+    if move_from - move_to == 16:
+        return move_from - 48
+    return move_from * 3 + (move_to & 7) - (move_from & 7) + 1
+
+
+def mix64(value):
+    value = (value + 0x9E3779B97F4A7C15) & FULL_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & FULL_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & FULL_MASK
+    return value ^ (value >> 31)
+
+
+def mix64_array(values):
+    with np.errstate(over='ignore'):
+        values = values + np.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def slot_hash(state_hi, state_lo, action):
+    return mix64(state_lo ^ mix64((state_hi + action) & FULL_MASK))
+
+
+def slot_hash_array(state_hi, state_lo, actions):
+    with np.errstate(over='ignore'):
+        return mix64_array(state_lo ^ mix64_array(state_hi + actions.astype(np.uint64)))
+
+
+class CompactQTable:
+    # Open-addressing (linear probing) Q-table over parallel NumPy arrays. Keys are the same
+    # (state, action) pairs q_table has always used; the state, a Zobrist key or a packed 128-bit
+    # board, is split into two uint64 halves and stored with a one-byte action and a float32 value.
+
+    def __init__(self, capacity=1024, max_load=0.7):
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.max_load = max_load
+        self.count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.state_hi = np.zeros(capacity, dtype=np.uint64)
+        self.state_lo = np.zeros(capacity, dtype=np.uint64)
+        self.actions = np.full(capacity, NO_ACTION, dtype=np.uint8)
+        self.values = np.zeros(capacity, dtype=np.float32)
+
+    def _find(self, key):
+        state = encode_state(key[0])
+        action = encode_action(key[1])
+        state_hi, state_lo = state >> 64, state & FULL_MASK
+        mask = self.capacity - 1
+        slot = slot_hash(state_hi, state_lo, action) & mask
+        actions, highs, lows = self.actions, self.state_hi, self.state_lo
+        while True:
+            stored = actions[slot]
+            if stored == NO_ACTION:
+                return slot, False, state_hi, state_lo, action
+            if stored == action and lows[slot] == state_lo and highs[slot] == state_hi:
+                return slot, True, state_hi, state_lo, action
+            slot = (slot + 1) & mask
+
+    def get(self, key, default=None):
+        slot, found = self._find(key)[:2]
+        return float(self.values[slot]) if found else default
+
+    def __getitem__(self, key):
+        slot, found = self._find(key)[:2]
+        if not found:
+            raise KeyError(key)
+        return float(self.values[slot])
+
+    def __contains__(self, key):
+        return self._find(key)[1]
+
+    def __setitem__(self, key, value):
+        slot, found, state_hi, state_lo, action = self._find(key)
+        if not found:
+            if (self.count + 1) > self.capacity * self.max_load:
+                self._grow()
+                slot, found, state_hi, state_lo, action = self._find(key)
+            self.state_hi[slot] = state_hi
+            self.state_lo[slot] = state_lo
+            self.actions[slot] = action
+            self.count += 1
+        self.values[slot] = value
+
+    def __len__(self):
+        return self.count
+
+    def _find_many(self, states, actions):
+        # Vectorized _find for 64-bit (Zobrist) states: probes every key in lockstep, one slot
+        # further each round, until each has hit its key or an empty slot.
+        mask = self.capacity - 1
+        slots = (slot_hash_array(np.zeros(len(states), dtype=np.uint64), states, actions)
+                 & np.uint64(mask)).astype(np.int64)
+        found = np.zeros(len(states), dtype=bool)
+        pending = np.arange(len(states))
+        while len(pending):
+            candidate_slots = slots[pending]
+            stored = self.actions[candidate_slots]
+            hit = ((stored == actions[pending]) & (self.state_lo[candidate_slots] == states[pending])
+                   & (self.state_hi[candidate_slots] == 0))
+            found[pending[hit]] = True
+            pending = pending[~hit & (stored != NO_ACTION)]
+            slots[pending] = (slots[pending] + 1) & mask
+        return slots, found
+
+    def get_many(self, states, actions, default=0.0):
+        states = np.asarray(states, dtype=np.uint64)
+        actions = np.asarray(actions, dtype=np.uint8)
+        slots, found = self._find_many(states, actions)
+        return np.where(found, self.values[slots], np.float32(default))
+
+    def set_many(self, states, actions, values):
+        # Last write wins for keys repeated within one call.
+        states = np.asarray(states, dtype=np.uint64)
+        actions = np.asarray(actions, dtype=np.uint8)
+        values = np.asarray(values, dtype=np.float32)
+        slots, found = self._find_many(states, actions)
+        self.values[slots[found]] = values[found]
+        missing = np.flatnonzero(~found)
+        if not len(missing):
+            return
+        keys = np.stack([states[missing], actions[missing].astype(np.uint64)], axis=1)
+        _, last = np.unique(keys[::-1], axis=0, return_index=True)
+        missing = missing[::-1][last]
+        if self.count + len(missing) > self.capacity * self.max_load:
+            self._grow(self.count + len(missing))
+        self._place_new(np.zeros(len(missing), dtype=np.uint64), states[missing], actions[missing], values[missing])
+        self.count += len(missing)
+
+    def __iter__(self):
+        for state, action, _ in self._occupied():
+            yield state, action
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for state, action, value in self._occupied():
+            yield (state, action), value
+
+    def _occupied(self):
+        for slot in np.flatnonzero(self.actions != NO_ACTION):
+            state = (int(self.state_hi[slot]) << 64) | int(self.state_lo[slot])
+            yield state, int(self.actions[slot]), float(self.values[slot])
+
+    def copy(self):
+        table = CompactQTable.__new__(CompactQTable)
+        table.max_load = self.max_load
+        table.count = self.count
+        table.capacity = self.capacity
+        table.state_hi = self.state_hi.copy()
+        table.state_lo = self.state_lo.copy()
+        table.actions = self.actions.copy()
+        table.values = self.values.copy()
+        return table
+
+    def _grow(self, entries=None):
+        occupied = self.actions != NO_ACTION
+        state_hi = self.state_hi[occupied]
+        state_lo = self.state_lo[occupied]
+        actions = self.actions[occupied]
+        values = self.values[occupied]
+        capacity = self.capacity * 2
+        while entries is not None and entries > capacity * self.max_load:
+            capacity *= 2
+        self._allocate(capacity)
+        self._place_new(state_hi, state_lo, actions, values)
+
+    def _place_new(self, state_hi, state_lo, actions, values):
+        # Vectorized linear-probing insert of keys known to be absent and distinct: every round,
+        # each empty home slot takes the first candidate pointing at it and the rest move on.
+        mask = np.uint64(self.capacity - 1)
+        slots = (slot_hash_array(state_hi, state_lo, actions) & mask).astype(np.int64)
+        pending = np.arange(len(actions))
+        while len(pending):
+            candidate_slots = slots[pending]
+            free = self.actions[candidate_slots] == NO_ACTION
+            winners_slots, first = np.unique(candidate_slots[free], return_index=True)
+            winners = pending[free][first]
+            self.state_hi[winners_slots] = state_hi[winners]
+            self.state_lo[winners_slots] = state_lo[winners]
+            self.actions[winners_slots] = actions[winners]
+            self.values[winners_slots] = values[winners]
+            placed = np.zeros(len(actions), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & (self.capacity - 1)
+
+    def save(self, path):
+        # Header, then the state_hi, state_lo, values and actions arrays exactly as they sit in
+        # memory, so MmapQTable can probe the file in place.
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as handle:
+            header = Q_TABLE_HEADER.pack(Q_TABLE_MAGIC, Q_TABLE_VERSION, 0, self.capacity, self.count)
+            handle.write(header.ljust(Q_TABLE_HEADER_SIZE, b"\0"))
+            for array in (self.state_hi, self.state_lo, self.values, self.actions):
+                handle.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        return MmapQTable(path, writable=True)
+
+    @classmethod
+    def from_dict(cls, q_table):
+        compact = cls(int(len(q_table) / 0.7) + 1)
+        for key, value in q_table.items():
+            compact[key] = value
+        return compact
+
+    def memory_usage(self):
+        nbytes = self.state_hi.nbytes + self.state_lo.nbytes + self.actions.nbytes + self.values.nbytes
+        return {
+            "entries": self.count,
+            "capacity": self.capacity,
+            "bytes": nbytes,
+            "bytes_per_entry": nbytes / self.count if self.count else 0.0,
+        }
+
+
+class MmapQTable(CompactQTable):
+    # View of a file written by CompactQTable.save. Opening only reads the header; lookups page
+    # the arrays in on demand and processes mapping the same file share the pages. A writable
+    # table maps the file copy-on-write: updates go to private copies of the touched pages and
+    # never reach the file, and growing past the file's capacity moves the table into memory.
+
+    def __init__(self, path, writable=False):
+        with open(path, "rb") as handle:
+            access = mmap.ACCESS_COPY if writable else mmap.ACCESS_READ
+            self.mapping = mmap.mmap(handle.fileno(), 0, access=access)
+        magic, version, _, capacity, count = Q_TABLE_HEADER.unpack_from(self.mapping)
+        if magic != Q_TABLE_MAGIC or version != Q_TABLE_VERSION:
+            raise ValueError(f"{path} is not a version {Q_TABLE_VERSION} Q-table file")
+        self.path = path
+        self.writable = writable
+        self.capacity = capacity
+        self.count = count
+        self.max_load = 0.7 if writable else 1.0
+        offset = Q_TABLE_HEADER_SIZE
+        arrays = []
+        for dtype in (np.uint64, np.uint64, np.float32, np.uint8):
+            arrays.append(np.frombuffer(self.mapping, dtype=dtype, count=capacity, offset=offset))
+            offset += capacity * np.dtype(dtype).itemsize
+        self.state_hi, self.state_lo, self.values, self.actions = arrays
+
+    def __setitem__(self, key, value):
+        if not self.writable:
+            raise TypeError(f"Q-table {self.path} is memory-mapped read-only; use CompactQTable.load to train on it")
+        super().__setitem__(key, value)
+
+    def set_many(self, states, actions, values):
+        if not self.writable:
+            raise TypeError(f"Q-table {self.path} is memory-mapped read-only; use CompactQTable.load to train on it")
+        super().set_many(states, actions, values)
+
+    def __reduce__(self):
+        # A writable table may differ from its file, so it is sent as an in-memory copy.
+        if self.writable:
+            return CompactQTable.__new__, (CompactQTable,), vars(self.copy())
+        return MmapQTable, (self.path,)
+
+
+def save_q_table(q_table, path):
+    if not isinstance(q_table, CompactQTable):
+        q_table = CompactQTable.from_dict(q_table)
+    q_table.save(path)
+
+
+class OpeningBook:
+    # Position key (get_state_representation with the AI to move) -> (from, to) square indices.
+    # On disk: header, then the keys as uint64 and the moves as uint8 pairs, in matching order.
+
+    def __init__(self, moves=None):
+        self.moves = {} if moves is None else moves
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __contains__(self, key):
+        return key in self.moves
+
+    def probe(self, key):
+        return self.moves.get(key)
+
+    def add(self, key, move):
+        self.moves[key] = move
+
+    def save(self, path):
+        keys = np.fromiter(self.moves, dtype=np.uint64, count=len(self.moves))
+        moves = np.array([self.moves[key] for key in self.moves], dtype=np.uint8).reshape(-1, 2)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as handle:
+            handle.write(OPENING_BOOK_HEADER.pack(OPENING_BOOK_MAGIC, 1, len(keys)))
+            handle.write(keys.tobytes())
+            handle.write(moves.tobytes())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as handle:
+            data = handle.read()
+        magic, _, count = OPENING_BOOK_HEADER.unpack_from(data)
+        if magic != OPENING_BOOK_MAGIC:
+            raise ValueError(f"{path} is not an opening book file")
+        offset = OPENING_BOOK_HEADER.size
+        keys = np.frombuffer(data, dtype=np.uint64, count=count, offset=offset)
+        moves = np.frombuffer(data, dtype=np.uint8, count=2 * count, offset=offset + 8 * count).reshape(-1, 2)
+        return cls({int(key): (int(move_from), int(move_to)) for key, (move_from, move_to) in zip(keys, moves)})
+
+
+def tablebase_materials(max_pawns):
+    # (player pawns, AI pawns) for every material count up to max_pawns, fewest pawns first.
+    return [(pawns, total - pawns) for total in range(max_pawns + 1) for pawns in range(total + 1)]
+
+
+def tablebase_index(player_mask, ai_mask, ai_pawns):
+    # Combinatorial rank of each side's pawn set: player pawns over rows 0-6 (squares 0-55), AI
+    # pawns over rows 1-7 (squares 8-63), since a pawn on its goal row has already won.
+    player_rank = 0
+    for position, square in enumerate(iter_bits(player_mask)):
+        player_rank += math.comb(square, position + 1)
+    ai_rank = 0
+    for position, square in enumerate(iter_bits(ai_mask)):
+        ai_rank += math.comb(square - 8, position + 1)
+    return player_rank * math.comb(56, ai_pawns) + ai_rank
+
+
+class EndgameTablebase:
+    # Read-only view of a file written by BuildTablebase.py: one int8 per position for each
+    # material split and side to move. A value v > 0 means the side to move wins in v plies;
+    # v < 0 means it loses, with the game ending -1 - v plies from now.
+
+    def __init__(self, path):
+        with open(path, "rb") as handle:
+            self.mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, self.max_pawns = TABLEBASE_HEADER.unpack_from(self.mapping)
+        if magic != TABLEBASE_MAGIC:
+            raise ValueError(f"{path} is not an endgame tablebase file")
+        self.values = np.frombuffer(self.mapping, dtype=np.int8, offset=TABLEBASE_HEADER.size)
+        self.offsets = {}
+        offset = 0
+        for player_pawns, ai_pawns in tablebase_materials(self.max_pawns):
+            size = math.comb(56, player_pawns) * math.comb(56, ai_pawns)
+            for piece in ('P', 'p'):
+                self.offsets[player_pawns, ai_pawns, piece] = offset
+                offset += size
+
+    def covers(self, player_mask, ai_mask):
+        return (player_mask.bit_count() + ai_mask.bit_count() <= self.max_pawns
+                and not player_mask & ROW_MASKS[7] and not ai_mask & ROW_MASKS[0])
+
+    def probe(self, player_mask, ai_mask, piece):
+        if not self.covers(player_mask, ai_mask):
+            return None
+        ai_pawns = ai_mask.bit_count()
+        offset = self.offsets[player_mask.bit_count(), ai_pawns, piece]
+        return int(self.values[offset + tablebase_index(player_mask, ai_mask, ai_pawns)])
+
+    def best_move(self, player_mask, ai_mask, piece):
+        # Fastest win if there is one, otherwise the longest resistance.
+        goal = ROW_MASKS[7] if piece == 'P' else ROW_MASKS[0]
+        opponent = 'p' if piece == 'P' else 'P'
+        best_move, best_score = None, None
+        for move_from, move_to in generate_bitboard_moves(player_mask, ai_mask, piece):
+            if (1 << move_to) & goal:
+                return move_from, move_to
+            value = self.probe(*apply_bitboard_move(player_mask, ai_mask, piece, move_from, move_to), opponent)
+            score = 1000 + value if value < 0 else value
+            if best_score is None or score > best_score:
+                best_move, best_score = (move_from, move_to), score
+        return best_move
+
+
+class ReplayBuffer:
+    # Fixed-capacity ring of transitions in parallel arrays. States are Zobrist keys and actions
+    # encode_action slots, both already canonicalized by q_key; next_moves packs the 192-slot mask
+    # of the next state's actions that the update maximizes over.
+
+    def __init__(self, capacity=100000, batch_size=256, replay_ratio=1.0, seed=None):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.replay_ratio = replay_ratio
+        self.rng = np.random.default_rng(seed)
+        self.states = np.zeros(capacity, dtype=np.uint64)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.uint64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.next_moves = np.zeros((capacity, 24), dtype=np.uint8)
+        self.size = 0
+        self.position = 0
+        self.pending = 0.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done, next_actions):
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        moves = self.next_moves[index]
+        moves.fill(0)
+        for next_action in next_actions:
+            moves[next_action >> 3] |= 1 << (next_action & 7)
+        self.position = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.pending += 1
+
+    def due_batches(self):
+        # Minibatches owed so that, on average, replay_ratio updates are made per stored transition.
+        batches = int(self.pending * self.replay_ratio) // self.batch_size
+        self.pending -= batches * self.batch_size / self.replay_ratio
+        return batches
+
+    def sample(self, batch_size=None):
+        return self.rng.integers(0, self.size, batch_size or self.batch_size)
+
+    def update(self, q_table, indices, learning_rate, discount_factor):
+        # The make_move rule, Q <- (1 - lr) Q + lr (r + gamma max Q'), for a whole minibatch. The
+        # bootstrap term is dropped for transitions that ended the game.
+        states, actions = self.states[indices], self.actions[indices]
+        legal = np.unpackbits(self.next_moves[indices], axis=1, bitorder='little')[:, :192]
+        rows, next_actions = np.nonzero(legal)
+        next_values = q_table.get_many(self.next_states[indices][rows], next_actions)
+        next_max = np.full(len(indices), -np.inf, dtype=np.float32)
+        np.maximum.at(next_max, rows, next_values)
+        next_max[np.isneginf(next_max)] = 0.0
+        targets = self.rewards[indices] + discount_factor * next_max * ~self.dones[indices]
+        values = (1 - learning_rate) * q_table.get_many(states, actions) + learning_rate * targets
+        q_table.set_many(states, actions, values)
+        return states, actions
+
+
+def encode_ply(piece, move_from, move_to):
+    # One byte: from square (6 bits) and move kind (2 bits: forward, left capture, right capture,
+    # two-square). The side is implied by ply parity. A pawn never moves off its goal row, so a
+    # backwards en passant capture is written with its from square moved to that row.
+    kind = 3 if abs(move_to - move_from) == 16 else (0, 2, 1)[(move_to & 7) - (move_from & 7)]
+    if (move_to > move_from) != (piece == 'P'):
+        move_from = (move_from & 7) | (56 if piece == 'P' else 0)
+    return move_from << 2 | kind
+
+
+def decode_ply(piece, byte):
+    move_from, kind = byte >> 2, byte & 3
+    forward = 8 if piece == 'P' else -8
+    if move_from >> 3 == (7 if piece == 'P' else 0):
+        move_from = (move_from & 7) | (24 if piece == 'P' else 32)
+        return move_from, move_from - forward + (-1 if kind == 1 else 1)
+    if kind == 3:
+        return move_from, move_from + 2 * forward
+    return move_from, move_from + forward + (0, -1, 1)[kind]
+
+
+class GameRecordWriter:
+    # Append-only game log: a magic header once, then per game a uint16 ply count, the winner byte
+    # (0 player, 1 AI, 255 unfinished) and one encode_ply byte per ply. Each game is flushed as it
+    # is written, so a killed process loses at most the game it was writing.
+
+    def __init__(self, path):
+        self.handle = open(path, "ab")
+        if self.handle.tell() == 0:
+            self.handle.write(GAME_RECORD_MAGIC)
+
+    def write_game(self, moves, winner=None):
+        data = bytearray(GAME_RECORD_HEADER.pack(len(moves), {'P': 0, 'p': 1}.get(winner, 255)))
+        for ply, (move_from, move_to) in enumerate(moves):
+            data.append(encode_ply('P' if ply % 2 == 0 else 'p', move_from, move_to))
+        self.handle.write(data)
+        self.handle.flush()
+
+    def flush(self):
+        self.handle.flush()
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def read_game_records(path):
+    # Yields (winner, [(from, to), ...]) one game at a time, so files of any size stream through.
+    # A file cut off inside a game raises ValueError once the complete games before it are read.
+    with open(path, "rb") as handle:
+        if handle.read(len(GAME_RECORD_MAGIC)) != GAME_RECORD_MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        while True:
+            header = handle.read(GAME_RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < GAME_RECORD_HEADER.size:
+                raise ValueError(f"{path} ends inside a game record header")
+            plies, winner = GAME_RECORD_HEADER.unpack(header)
+            data = handle.read(plies)
+            if len(data) < plies:
+                raise ValueError(f"{path} ends inside a game record: {len(data)} of {plies} plies")
+            moves = [decode_ply('P' if ply % 2 == 0 else 'p', byte) for ply, byte in enumerate(data)]
+            yield {0: 'P', 1: 'p'}.get(winner), moves
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    # Two-slot buckets over flat uint64 arrays: slot 0 keeps the deepest result of the current
+    # search, slot 1 always takes the newest. Keys are stored XORed with their data so a torn
+    # write from another process reads back as a miss rather than a wrong entry.
+    EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+    def __init__(self, megabytes=16, keys=None, data=None, generation=None):
+        if keys is None:
+            buckets = max(1, (megabytes << 20) // 32)
+            buckets = 1 << (buckets.bit_length() - 1)
+            keys = np.zeros(buckets * 2, dtype=np.uint64)
+            data = np.zeros(buckets * 2, dtype=np.uint64)
+        self.keys = keys
+        self.data = data
+        self.bucket_mask = len(keys) // 2 - 1
+        # A shared table also shares its generation: the owner advances it once per search and
+        # every process reads it in new_search, so they all age and replace entries alike.
+        self.shared_generation = generation
+        self.generation = 1 if generation is None else int(generation[0])
+
+    def new_search(self):
+        if self.shared_generation is None:
+            self.generation = self.generation % 255 + 1
+        else:
+            self.generation = int(self.shared_generation[0])
+
+    def advance_generation(self):
+        self.shared_generation[0] = self.shared_generation[0] % 255 + 1
+
+    def clear(self):
+        self.keys.fill(0)
+        self.data.fill(0)
+
+    def probe(self, key):
+        index = (key & self.bucket_mask) << 1
+        for slot in (index, index + 1):
+            data = self.data.item(slot)
+            if data and self.keys.item(slot) ^ data == key:
+                move = None
+                if data >> 54 & 1:
+                    move = (data >> 42 & 63, data >> 48 & 63)
+                return (data & 0xFFFFFFFF) - (1 << 31), data >> 32 & 0xFF, data >> 40 & 3, move
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        data = (score + (1 << 31)) | depth << 32 | flag << 40 | self.generation << 56
+        if move is not None:
+            data |= move[0] << 42 | move[1] << 48 | 1 << 54
+        index = (key & self.bucket_mask) << 1
+        stored = self.data.item(index)
+        if (not stored or self.keys.item(index) ^ stored == key or depth >= (stored >> 32 & 0xFF)
+                or stored >> 56 != self.generation):
+            slot = index
+        else:
+            slot = index + 1
+        self.keys[slot] = key ^ data
+        self.data[slot] = data
+
+    def memory_bytes(self):
+        return self.keys.nbytes + self.data.nbytes
+
+
+class AlphaBetaSearch:
+    # Negamax alpha-beta with a transposition table, killer/history move ordering and iterative
+    # deepening under a per-move time budget. choose_move is the drop-in for ai_make_move.
+
+    def __init__(self, time_limit=1.0, max_depth=64, tt_megabytes=16, transposition_table=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.tt = transposition_table or TranspositionTable(tt_megabytes)
+        self.history = [0] * 4096
+        self.killers = [[None, None] for _ in range(max_depth + 2)]
+        self.last_info = None
+
+    def choose_move(self, board):
+        info = self.search(board.bitboards['P'], board.bitboards['p'], board.current_player,
+                           board.en_passant_square())
+        return info["move"]
+
+    def search(self, player_mask, ai_mask, piece, en_passant=None, time_limit=None, max_depth=None, start_depth=1,
+               shuffle_seed=None):
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = min(self.max_depth if max_depth is None else max_depth, self.max_depth)
+        self.en_passant = en_passant
+        self.nodes = 0
+        self.tt.new_search()
+        self.history = [value >> 2 for value in self.history]
+        start = time.perf_counter()
+        self.deadline = start + time_limit
+        key = position_key(player_mask, ai_mask, piece)
+        moves = generate_bitboard_moves(player_mask, ai_mask, piece, en_passant)
+        if shuffle_seed is not None:
+            random.Random(shuffle_seed).shuffle(moves)
+        best_move, best_score, completed_depth = (moves[0] if moves else None), -WIN_SCORE, 0
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            if not moves:
+                break
+            try:
+                move, score = self._search_root(player_mask, ai_mask, piece, key, depth, moves)
+            except SearchTimeout:
+                if self.root_best is not None:
+                    best_move, best_score = self.root_best
+                break
+            best_move, best_score, completed_depth = move, score, depth
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= WIN_SCORE - max_depth or time.perf_counter() > self.deadline:
+                break
+        seconds = time.perf_counter() - start
+        self.last_info = {
+            "move": best_move,
+            "score": best_score,
+            "depth": completed_depth,
+            "nodes": self.nodes,
+            "seconds": seconds,
+            "nodes_per_second": self.nodes / seconds if seconds > 0 else 0.0,
+        }
+        return self.last_info
+
+    def _search_root(self, player_mask, ai_mask, piece, key, depth, moves):
+        opponent = 'p' if piece == 'P' else 'P'
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        self.root_best = None
+        for move in moves:
+            new_player_mask, new_ai_mask = apply_bitboard_move(player_mask, ai_mask, piece, *move)
+            new_key = update_zobrist(key, player_mask, ai_mask, new_player_mask, new_ai_mask)
+            score = -self._negamax(new_player_mask, new_ai_mask, opponent, new_key, depth - 1, -beta, -alpha, 1)
+            if score > alpha:
+                alpha = score
+                self.root_best = (move, score)
+        self.tt.store(key, depth, alpha, TranspositionTable.EXACT, self.root_best[0])
+        return self.root_best
+
+    def _negamax(self, player_mask, ai_mask, piece, key, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if piece == 'P':
+            if ai_mask & ROW_MASKS[0]:
+                return ply - WIN_SCORE
+            goal_row = 7
+        else:
+            if player_mask & ROW_MASKS[7]:
+                return ply - WIN_SCORE
+            goal_row = 0
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            score, entry_depth, flag, tt_move = entry
+            if entry_depth >= depth:
+                if score > WIN_SCORE - 1000:
+                    score -= ply
+                elif score < 1000 - WIN_SCORE:
+                    score += ply
+                if flag == TranspositionTable.EXACT:
+                    return score
+                if flag == TranspositionTable.LOWER_BOUND and score >= beta:
+                    return score
+                if flag == TranspositionTable.UPPER_BOUND and score <= alpha:
+                    return score
+        if depth <= 0:
+            return evaluate_position(player_mask, ai_mask, piece)
+        moves = generate_bitboard_moves(player_mask, ai_mask, piece, self.en_passant)
+        if not moves:
+            return ply - WIN_SCORE
+        for move in moves:
+            if move[1] >> 3 == goal_row:
+                return WIN_SCORE - ply - 1
+        opponent_mask = ai_mask if piece == 'P' else player_mask
+        killers = self.killers[ply]
+        history = self.history
+
+        def order(move):
+            if move == tt_move:
+                return 1 << 40
+            if opponent_mask >> move[1] & 1:
+                return (1 << 32) + abs((move[1] >> 3) - (7 - goal_row))
+            if move == killers[0] or move == killers[1]:
+                return 1 << 31
+            return history[move[0] << 6 | move[1]]
+
+        moves.sort(key=order, reverse=True)
+        opponent = 'p' if piece == 'P' else 'P'
+        original_alpha = alpha
+        best_score, best_move = -WIN_SCORE - 1, None
+        for move in moves:
+            new_player_mask, new_ai_mask = apply_bitboard_move(player_mask, ai_mask, piece, *move)
+            new_key = update_zobrist(key, player_mask, ai_mask, new_player_mask, new_ai_mask)
+            score = -self._negamax(new_player_mask, new_ai_mask, opponent, new_key, depth - 1, -beta, -alpha, ply + 1)
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not opponent_mask >> move[1] & 1:
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            history[move[0] << 6 | move[1]] += depth * depth
+                        break
+        if best_score <= original_alpha:
+            flag = TranspositionTable.UPPER_BOUND
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER_BOUND
+        else:
+            flag = TranspositionTable.EXACT
+        stored_score = best_score
+        if best_score > WIN_SCORE - 1000:
+            stored_score += ply
+        elif best_score < 1000 - WIN_SCORE:
+            stored_score -= ply
+        self.tt.store(key, depth, stored_score, flag, best_move)
+        return best_score
+
+
+class LazySMPSearch:
+    # Lazy SMP: helper processes search the same root as the main AlphaBetaSearch and share its
+    # transposition table through shared memory, so the entries one stores become cutoffs and move
+    # hints for the others. Helpers start at staggered depths with shuffled root moves to spread
+    # the work; the deepest completed result wins, the main search's on ties. With workers=1 this
+    # is the plain, deterministic single-process search.
+
+    def __init__(self, workers=None, time_limit=1.0, max_depth=64, tt_megabytes=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.pool = None
+        transposition_table = None
+        if self.workers > 1:
+            buckets = max(1, (tt_megabytes << 20) // 32)
+            slots = 2 << (buckets.bit_length() - 1)
+            self.shared_keys = multiprocessing.RawArray('Q', slots)
+            self.shared_data = multiprocessing.RawArray('Q', slots)
+            self.shared_generation = multiprocessing.RawArray('Q', [1])
+            transposition_table = TranspositionTable(keys=np.frombuffer(self.shared_keys, dtype=np.uint64),
+                                                     data=np.frombuffer(self.shared_data, dtype=np.uint64),
+                                                     generation=np.frombuffer(self.shared_generation, dtype=np.uint64))
+            self.pool = multiprocessing.Pool(self.workers - 1, initializer=_init_smp_worker,
+                                             initargs=(self.shared_keys, self.shared_data, self.shared_generation,
+                                                       max_depth))
+        self.engine = AlphaBetaSearch(time_limit, max_depth, tt_megabytes, transposition_table)
+        self.last_info = None
+
+    def choose_move(self, board):
+        info = self.search(board.bitboards['P'], board.bitboards['p'], board.current_player,
+                           board.en_passant_square())
+        return info["move"]
+
+    def search(self, player_mask, ai_mask, piece, en_passant=None, time_limit=None, max_depth=None):
+        time_limit = self.time_limit if time_limit is None else time_limit
+        pending = []
+        if self.pool is not None:
+            self.engine.tt.advance_generation()
+            pending = [self.pool.apply_async(_run_smp_worker, ((player_mask, ai_mask, piece, en_passant, time_limit,
+                                                                max_depth, worker),))
+                       for worker in range(1, self.workers)]
+        main = dict(self.engine.search(player_mask, ai_mask, piece, en_passant, time_limit, max_depth))
+        helpers = [result.get() for result in pending]
+        best = max([main] + helpers, key=lambda info: info["depth"])
+        seconds = max([main["seconds"]] + [info["seconds"] for info in helpers])
+        nodes = main["nodes"] + sum(info["nodes"] for info in helpers)
+        self.last_info = {
+            "move": best["move"],
+            "score": best["score"],
+            "depth": best["depth"],
+            "main_depth": main["depth"],
+            "helper_depths": [info["depth"] for info in helpers],
+            "workers": self.workers,
+            "nodes": nodes,
+            "seconds": seconds,
+            "nodes_per_second": nodes / seconds if seconds > 0 else 0.0,
+        }
+        return self.last_info
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+_smp_search = None
+
+
+def _init_smp_worker(shared_keys, shared_data, shared_generation, max_depth):
+    global _smp_search
+    transposition_table = TranspositionTable(keys=np.frombuffer(shared_keys, dtype=np.uint64),
+                                             data=np.frombuffer(shared_data, dtype=np.uint64),
+                                             generation=np.frombuffer(shared_generation, dtype=np.uint64))
+    _smp_search = AlphaBetaSearch(max_depth=max_depth, transposition_table=transposition_table)
+
+
+def _run_smp_worker(job):
+    player_mask, ai_mask, piece, en_passant, time_limit, max_depth, worker = job
+    return _smp_search.search(player_mask, ai_mask, piece, en_passant, time_limit, max_depth,
+                              start_depth=1 + worker % 2, shuffle_seed=worker)
+
+
+class MonteCarloTreeSearch:
+    # UCT over a fixed pool of nodes held in parallel lists. Children are linked through
+    # first_child/next_sibling, so when the root moves on, every node outside the kept subtree
+    # goes back on the free list and is reused by the next search.
+    MAX_PLAYOUT_PLIES = 400
+
+    def __init__(self, playouts=None, time_limit=1.0, exploration=1.4, max_nodes=200000, seed=None):
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.parent = [-1] * max_nodes
+        self.first_child = [-1] * max_nodes
+        self.next_sibling = [-1] * max_nodes
+        self.move = [None] * max_nodes
+        self.player_mask = [0] * max_nodes
+        self.ai_mask = [0] * max_nodes
+        self.side = [None] * max_nodes
+        self.expanded = [False] * max_nodes
+        self.visits = [0] * max_nodes
+        self.wins = [0.0] * max_nodes
+        self.free = list(range(max_nodes - 1, -1, -1))
+        self.root = -1
+        self.en_passant = None
+        self.last_info = None
+
+    def _new_node(self, parent, move, player_mask, ai_mask, side):
+        node = self.free.pop()
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.next_sibling[node] = -1
+        self.move[node] = move
+        self.player_mask[node] = player_mask
+        self.ai_mask[node] = ai_mask
+        self.side[node] = side
+        self.expanded[node] = False
+        self.visits[node] = 0
+        self.wins[node] = 0.0
+        return node
+
+    def _release(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            child = self.first_child[node]
+            while child != -1:
+                stack.append(child)
+                child = self.next_sibling[child]
+            self.free.append(node)
+
+    def _children(self, node):
+        child = self.first_child[node]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def _set_root(self, player_mask, ai_mask, side):
+        # Keep the subtree for this position if it is the root, a child or a grandchild of the
+        # previous root; otherwise start a fresh tree.
+        root = self.root
+        found = -1
+        if root != -1:
+            candidates = [root]
+            for child in self._children(root):
+                candidates.append(child)
+                candidates.extend(self._children(child))
+            for node in candidates:
+                if (self.player_mask[node] == player_mask and self.ai_mask[node] == ai_mask
+                        and self.side[node] == side):
+                    found = node
+                    break
+        if found == -1:
+            if root != -1:
+                self._release(root)
+            self.root = self._new_node(-1, None, player_mask, ai_mask, side)
+            return
+        node = found
+        while node != root:
+            parent = self.parent[node]
+            child = self.first_child[parent]
+            while child != -1:
+                following = self.next_sibling[child]
+                if child != node:
+                    self._release(child)
+                child = following
+            self.free.append(parent)
+            node = parent
+        self.parent[found] = -1
+        self.next_sibling[found] = -1
+        self.root = found
+
+    def _winner(self, player_mask, ai_mask):
+        if player_mask & ROW_MASKS[7]:
+            return 'P'
+        if ai_mask & ROW_MASKS[0]:
+            return 'p'
+        return None
+
+    def _playout(self, player_mask, ai_mask, side):
+        en_passant = self.en_passant
+        choice = self.rng.choice
+        for _ in range(self.MAX_PLAYOUT_PLIES):
+            if player_mask & ROW_MASKS[7]:
+                return 'P'
+            if ai_mask & ROW_MASKS[0]:
+                return 'p'
+            moves = generate_bitboard_moves(player_mask, ai_mask, side, en_passant)
+            if not moves:
+                return 'p' if side == 'P' else 'P'
+            player_mask, ai_mask = apply_bitboard_move(player_mask, ai_mask, side, *choice(moves))
+            side = 'p' if side == 'P' else 'P'
+        return None
+
+    def _expand(self, node):
+        # A node is expanded with all of its children or not at all. When the pool cannot hold
+        # them it stays a leaf and playouts simply start from it until nodes are freed.
+        side = self.side[node]
+        player_mask, ai_mask = self.player_mask[node], self.ai_mask[node]
+        moves = generate_bitboard_moves(player_mask, ai_mask, side, self.en_passant)
+        if len(moves) > len(self.free):
+            return
+        self.expanded[node] = True
+        next_side = 'p' if side == 'P' else 'P'
+        previous = -1
+        for move in moves:
+            child = self._new_node(node, move, *apply_bitboard_move(player_mask, ai_mask, side, *move), next_side)
+            if previous == -1:
+                self.first_child[node] = child
+            else:
+                self.next_sibling[previous] = child
+            previous = child
+
+    def _select_child(self, node):
+        log_visits = np.log(self.visits[node] or 1)
+        best, best_value = -1, -1.0
+        visits, wins, exploration = self.visits, self.wins, self.exploration
+        child = self.first_child[node]
+        while child != -1:
+            count = visits[child]
+            if count == 0:
+                return child
+            value = wins[child] / count + exploration * (log_visits / count) ** 0.5
+            if value > best_value:
+                best, best_value = child, value
+            child = self.next_sibling[child]
+        return best
+
+    def run_playout(self):
+        node = self.root
+        while self.expanded[node] and self.first_child[node] != -1:
+            node = self._select_child(node)
+        player_mask, ai_mask, side = self.player_mask[node], self.ai_mask[node], self.side[node]
+        winner = self._winner(player_mask, ai_mask)
+        if winner is None and not self.expanded[node] and (self.visits[node] or node == self.root):
+            self._expand(node)
+            if self.first_child[node] != -1:
+                node = self.first_child[node]
+                player_mask, ai_mask, side = self.player_mask[node], self.ai_mask[node], self.side[node]
+        if winner is None:
+            winner = self._playout(player_mask, ai_mask, side)
+        while node != -1:
+            self.visits[node] += 1
+            mover = 'p' if self.side[node] == 'P' else 'P'
+            if winner is None:
+                self.wins[node] += 0.5
+            elif winner == mover:
+                self.wins[node] += 1.0
+            node = self.parent[node]
+
+    def search(self, player_mask, ai_mask, piece, en_passant=None, playouts=None, time_limit=None):
+        playouts = self.playouts if playouts is None else playouts
+        time_limit = self.time_limit if time_limit is None else time_limit
+        if en_passant != self.en_passant and self.root != -1:
+            self._release(self.root)
+            self.root = -1
+        self.en_passant = en_passant
+        self._set_root(player_mask, ai_mask, piece)
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit is not None else None
+        count = 0
+        while (playouts is None or count < playouts) and (deadline is None or time.perf_counter() < deadline):
+            self.run_playout()
+            count += 1
+        seconds = time.perf_counter() - start
+        best, best_visits = None, -1
+        for child in self._children(self.root):
+            if self.visits[child] > best_visits:
+                best, best_visits = child, self.visits[child]
+        self.last_info = {
+            "move": self.move[best] if best is not None else None,
+            "win_rate": self.wins[best] / best_visits if best_visits > 0 else 0.0,
+            "playouts": count,
+            "root_visits": self.visits[self.root],
+            "nodes_in_use": len(self.parent) - len(self.free),
+            "seconds": seconds,
+            "playouts_per_second": count / seconds if seconds > 0 else 0.0,
+        }
+        return self.last_info
+
+    def choose_move(self, board):
+        info = self.search(board.bitboards['P'], board.bitboards['p'], board.current_player,
+                           board.en_passant_square())
+        return info["move"]
+
+
+def popcount_array(values):
+    with np.errstate(over='ignore'):
+        values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+class BatchBreakthrough:
+    # K games advanced in lock-step as uint64 bitboard arrays. An action is from_square * 4 + kind,
+    # kind 0/1/2 a move to column -1/0/+1 and 3 the two-square move, matching is_valid_move.
+    # Every game starts from initialize_board and no move sets en_passant_target, so no batch
+    # game ever has an en passant move available.
+    ROW_0, ROW_7 = np.uint64(ROW_MASKS[0]), np.uint64(ROW_MASKS[7])
+    NOT_FILE_A, NOT_FILE_H = np.uint64(~FILE_A & FULL_MASK), np.uint64(~FILE_H & FULL_MASK)
+    PLAYER_START, AI_START = np.uint64(ROW_MASKS[0] | ROW_MASKS[1]), np.uint64(ROW_MASKS[6] | ROW_MASKS[7])
+    STEPS = np.array([[7, 8, 9, 16], [-9, -8, -7, -16]], dtype=np.int64)
+
+    def __init__(self, games, seed=None):
+        self.games = games
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self, which=None):
+        which = np.ones(self.games, dtype=bool) if which is None else which
+        if not hasattr(self, "player_masks"):
+            self.player_masks = np.zeros(self.games, dtype=np.uint64)
+            self.ai_masks = np.zeros(self.games, dtype=np.uint64)
+            self.ai_to_move = np.zeros(self.games, dtype=bool)
+            self.winners = np.full(self.games, -1, dtype=np.int8)
+            self.plies = np.zeros(self.games, dtype=np.int64)
+        self.player_masks[which] = self.PLAYER_START
+        self.ai_masks[which] = self.AI_START
+        self.ai_to_move[which] = False
+        self.winners[which] = -1
+        self.plies[which] = 0
+
+    def active(self):
+        return self.winners < 0
+
+    def origin_masks(self):
+        # (K, 4) origin squares of each kind of move for the side to move, as in generate_bitboard_moves.
+        player, ai = self.player_masks, self.ai_masks
+        empty = ~(player | ai)
+        eight, sixteen = np.uint64(8), np.uint64(16)
+        seven, nine = np.uint64(7), np.uint64(9)
+        player_moves = np.stack([
+            ((((player & self.NOT_FILE_A) << seven) & ai) >> seven),
+            (((player << eight) & empty) >> eight),
+            ((((player & self.NOT_FILE_H) << nine) & ai) >> nine),
+            ((((((player & self.PLAYER_START) << eight) & empty) << eight) & empty) >> sixteen),
+        ], axis=1)
+        ai_moves = np.stack([
+            ((((ai & self.NOT_FILE_A) >> nine) & player) << nine),
+            (((ai >> eight) & empty) << eight),
+            ((((ai & self.NOT_FILE_H) >> seven) & player) << seven),
+            ((((((ai & self.AI_START) >> eight) & empty) >> eight) & empty) << sixteen),
+        ], axis=1)
+        masks = np.where(self.ai_to_move[:, None], ai_moves, player_moves)
+        masks[~self.active()] = 0
+        return masks
+
+    def legal_actions(self):
+        masks = np.ascontiguousarray(self.origin_masks())
+        bits = np.unpackbits(masks.view(np.uint8).reshape(self.games, 4, 8), axis=2, bitorder='little')
+        return np.ascontiguousarray(bits.transpose(0, 2, 1)).reshape(self.games, 256).view(bool)
+
+    def random_actions(self, origins=None):
+        # Uniform over each game's legal actions without building the (K, 256) matrix: draw a rank
+        # below the move count, find the kind it falls in, then select that set bit by bisection.
+        origins = self.origin_masks() if origins is None else origins
+        counts = popcount_array(origins).astype(np.int64)
+        totals = counts.sum(axis=1)
+        ranks = (self.rng.random(self.games) * totals).astype(np.int64)
+        prefix = np.cumsum(counts, axis=1) - counts
+        kinds = (ranks[:, None] >= np.cumsum(counts, axis=1)).sum(axis=1).clip(max=3)
+        ranks = (ranks - prefix[np.arange(self.games), kinds]).astype(np.uint64)
+        masks = origins[np.arange(self.games), kinds]
+        squares = np.zeros(self.games, dtype=np.uint64)
+        for width in (32, 16, 8, 4, 2, 1):
+            shift = np.uint64(width)
+            low_counts = popcount_array(masks & np.uint64((1 << width) - 1))
+            high = ranks >= low_counts
+            ranks = np.where(high, ranks - low_counts, ranks)
+            masks = np.where(high, masks >> shift, masks)
+            squares += np.where(high, shift, np.uint64(0))
+        return np.where(totals > 0, squares.astype(np.int64) * 4 + kinds, -1)
+
+    def epsilon_greedy_actions(self, q_values, epsilon, legal=None):
+        origins = self.origin_masks()
+        legal = self.legal_actions() if legal is None else legal
+        greedy = np.where(legal, q_values, -np.inf).argmax(axis=1)
+        explore = self.rng.random(self.games) < epsilon
+        actions = np.where(explore, self.random_actions(origins), greedy)
+        actions[~legal.any(axis=1)] = -1
+        return actions
+
+    def step(self, actions):
+        # Applies one action per active game (-1 means the side to move has no legal move and
+        # loses), then passes the turn and records any game that reached its goal row.
+        active = self.active()
+        stuck = active & (actions < 0)
+        self.winners[stuck] = np.where(self.ai_to_move[stuck], 0, 1)
+        moving = active & (actions >= 0)
+        froms = actions[moving] // 4
+        tos = froms + self.STEPS[self.ai_to_move[moving].astype(np.int64), actions[moving] % 4]
+        one = np.uint64(1)
+        from_bits = one << froms.astype(np.uint64)
+        to_bits = one << tos.astype(np.uint64)
+        ai_moving = self.ai_to_move[moving]
+        player, ai = self.player_masks[moving], self.ai_masks[moving]
+        self.player_masks[moving] = np.where(ai_moving, player & ~to_bits, (player & ~from_bits) | to_bits)
+        self.ai_masks[moving] = np.where(ai_moving, (ai & ~from_bits) | to_bits, ai & ~to_bits)
+        self.ai_to_move[moving] = ~ai_moving
+        self.plies[moving] += 1
+        self.winners[moving & ((self.player_masks & self.ROW_7) != 0)] = 0
+        self.winners[moving & ((self.ai_masks & self.ROW_0) != 0)] = 1
+
+    def state_keys(self):
+        # The Zobrist key BreakthroughBoard.get_state_representation returns for each game.
+        keys = np.where(self.ai_to_move, np.uint64(SIDE_TO_MOVE_KEY), np.uint64(0))
+        one = np.uint64(1)
+        for square in range(64):
+            bit = one << np.uint64(square)
+            keys ^= np.where(self.player_masks & bit, np.uint64(ZOBRIST_KEYS['P'][square]), np.uint64(0))
+            keys ^= np.where(self.ai_masks & bit, np.uint64(ZOBRIST_KEYS['p'][square]), np.uint64(0))
+        return keys
+
+    def play_random_games(self, total_games=None, epsilon=None, q_function=None):
+        # Plays total_games (default: one per lane) with random moves, or epsilon-greedy over
+        # q_function(batch), which returns (K, 256) action values. Finished lanes restart with a new
+        # game while games remain to be started, so every lane keeps working.
+        total_games = self.games if total_games is None else total_games
+        self.reset()
+        started = min(total_games, self.games)
+        if started < self.games:
+            self.winners[started:] = 2
+        wins = np.zeros(3, dtype=np.int64)
+        finished = plies = steps = 0
+        start = time.perf_counter()
+        while finished < total_games:
+            if q_function is None:
+                actions = self.random_actions()
+            else:
+                actions = self.epsilon_greedy_actions(q_function(self), epsilon or 0.0)
+            self.step(actions)
+            steps += 1
+            done = (self.winners == 0) | (self.winners == 1)
+            if done.any():
+                finished += int(done.sum())
+                wins += np.bincount(self.winners[done], minlength=3)
+                plies += int(self.plies[done].sum())
+                restart = np.flatnonzero(done)[:max(0, total_games - started)]
+                started += len(restart)
+                self.winners[done] = 2
+                refill = np.zeros(self.games, dtype=bool)
+                refill[restart] = True
+                self.reset(refill)
+        seconds = time.perf_counter() - start
+        return {
+            "games": finished,
+            "wins": {'P': int(wins[0]), 'p': int(wins[1])},
+            "plies": plies,
+            "steps": steps,
+            "seconds": seconds,
+            "plies_per_second": plies / seconds if seconds > 0 else float('inf'),
+            "games_per_second": finished / seconds if seconds > 0 else float('inf'),
+        }
+
+
+class Instrumentation:
+    # Counts and times the board's hot methods while active. The methods are wrapped on the board
+    # instance on entry and unwrapped on exit, so an uninstrumented board runs the plain class code.
+    # Phase times are exclusive: time spent in a nested phase (e.g. move generation inside
+    # make_move) is charged to that phase only.
+    PHASES = {
+        "get_valid_moves": "move_generation",
+        "get_legal_moves": "move_generation",
+        "take_ai_turn": "decision",
+        "ai_make_move": "decision",
+        "determine_action": "decision",
+        "book_move": "decision",
+        "tablebase_move": "decision",
+        "make_move": "move_application",
+    }
+    COUNTERS = {
+        "get_valid_moves": "move_generations",
+        "get_legal_moves": "move_generations",
+        "get_q_value": "q_lookups",
+        "get_q_values": "q_lookups",
+        "update_q_value": "q_updates",
+        "find_closest_pawns": "board_scans",
+        "sync_board": "board_scans",
+    }
+
+    def __init__(self, board, path=None):
+        self.board = board
+        self.path = path
+        self.counters = dict.fromkeys(sorted(set(self.COUNTERS.values())), 0)
+        self.strategy_hits = {}
+        self.phase_seconds = dict.fromkeys(sorted(set(self.PHASES.values())), 0.0)
+        self.phase_calls = dict.fromkeys(self.phase_seconds, 0)
+        self.stack = []
+        self.started = None
+        self.seconds = 0.0
+
+    def __enter__(self):
+        for name in sorted(set(self.PHASES) | set(self.COUNTERS)):
+            setattr(self.board, name, self.wrap(name, getattr(self.board, name)))
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self.started
+        for name in set(self.PHASES) | set(self.COUNTERS):
+            self.board.__dict__.pop(name, None)
+        if self.path:
+            self.dump(self.path)
+        return False
+
+    def wrap(self, name, method):
+        counter = self.COUNTERS.get(name)
+        phase = self.PHASES.get(name)
+        counters = self.counters
+
+        def instrumented(*args, **kwargs):
+            if phase is not None:
+                self.enter_phase(phase)
+            hits = sum(self.strategy_hits.values())
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                if phase is not None:
+                    self.exit_phase()
+            if counter == "q_lookups" and name == "get_q_values":
+                counters[counter] += len(result)
+            elif counter is not None:
+                counters[counter] += 1
+            if name == "determine_action":
+                self.strategy_hits[result] = self.strategy_hits.get(result, 0) + 1
+            elif name == "book_move" and result is not None:
+                self.strategy_hits["Opening Book"] = self.strategy_hits.get("Opening Book", 0) + 1
+            elif name == "tablebase_move" and result is not None:
+                self.strategy_hits["Endgame Tablebase"] = self.strategy_hits.get("Endgame Tablebase", 0) + 1
+            elif name == "ai_make_move" and sum(self.strategy_hits.values()) == hits:
+                # No book, tablebase or determine_action answer: the row-6 capture shortcut fired.
+                self.strategy_hits["Immediate Capture"] = self.strategy_hits.get("Immediate Capture", 0) + 1
+            return result
+        return instrumented
+
+    def enter_phase(self, phase):
+        now = time.perf_counter()
+        if self.stack:
+            parent, started = self.stack[-1]
+            self.phase_seconds[parent] += now - started
+        self.stack.append((phase, now))
+        self.phase_calls[phase] += 1
+
+    def exit_phase(self):
+        now = time.perf_counter()
+        phase, started = self.stack.pop()
+        self.phase_seconds[phase] += now - started
+        if self.stack:
+            self.stack[-1] = (self.stack[-1][0], now)
+
+    def report(self):
+        return {
+            "seconds": self.seconds,
+            "counters": dict(self.counters),
+            "strategy_hits": dict(sorted(self.strategy_hits.items(), key=lambda item: -item[1])),
+            "phases": {phase: {"calls": self.phase_calls[phase], "seconds": self.phase_seconds[phase]}
+                       for phase in self.phase_seconds},
+        }
+
+    def dump(self, path):
+        with open(path, "w") as handle:
+            json.dump(self.report(), handle, indent=2)
+            handle.write("\n")
+
+
+# Percept bits for determine_action, computed once per turn from the incremental board state.
+PERCEPT_CAPTURE = 1
+PERCEPT_NEAR_MIDDLE = 2
+PERCEPT_NEAR_END = 4
+PERCEPT_ENDGAME = 8
+DECISION_RULES = (
+    (PERCEPT_CAPTURE, "Action: Move to capture opponent's pawn if possible"),
+    (PERCEPT_NEAR_MIDDLE, "Action: Move to block and capture the player's pawn if it's near rows 4 or 5"),
+    # This branch hands find_best_opponent_pawn_capture square names, so it never finds a capture:
+    # it ends in the default action and only keeps the endgame rule from firing.
+    (PERCEPT_NEAR_END, "Default Action"),
+    (PERCEPT_ENDGAME, "Action: Focus on reaching the other end of the board quickly for a win"),
+)
+
+
+def compile_decision_rules(rules):
+    # A list indexed by percept bitmask giving the first rule whose bits are all set.
+    size = 1 << max(mask for mask, _ in rules).bit_length()
+    return [next((action for mask, action in rules if percepts & mask == mask), "Default Action")
+            for percepts in range(size)]
+
+
 class BreakthroughBoard:
         
-    def __init__(self, learning_rate=0.1, discount_factor=0.9, exploration_prob=0.1):
-        self.board = [['.' for _ in range(8)] for _ in range(8)]
-        self.initialize_board()
-        self.current_player = 'P'
+    def __init__(self, learning_rate=0.1, discount_factor=0.9, exploration_prob=0.1, headless=False, q_table=None,
+                 mirror_states=False, ai_agent=None, opening_book=None, endgame_tablebase=None, replay_buffer=None):
+        self.reset_game()
         self.ai_piece = 'p'
-        self.user_move_history = []
-        self.ai_move_history = []
-        self.player_moves = 1
-        self.en_passant_target = None
+        self.headless = headless
+        self.rng = np.random
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_prob = exploration_prob
-        self.q_table = {}
+        self.q_table = {} if q_table is None else q_table
+        if replay_buffer is not None and not isinstance(self.q_table, CompactQTable):
+            self.q_table = CompactQTable.from_dict(self.q_table)
+        self.replay_buffer = replay_buffer
+        self.learning = True
+        self.game_writer = None
+        self.q_visits = None
+        self.mirror_states = mirror_states
+        self.ai_agent = ai_agent
+        self.opening_book = opening_book
+        self.endgame_tablebase = endgame_tablebase
         self.strategy_table = {
             "AI's Turn": {
                 "Prioritize Moving Closer to Player's Home Row": "Action: Move pawn closer to Player's home row",
@@ -42,13 +1627,63 @@ class BreakthroughBoard:
                 "Whose Turn It Is": "Action: Focus on reaching the other end of the board quickly for a win",
             },
         }
+        self.decision_index = compile_decision_rules(DECISION_RULES)
+        self.action_handlers = {
+            "Action: Move pawn closer to opponent's home row": self.play_move,
+            "Action: Move to capture opponent's pawn if possible": self.capture_toward_pawn,
+            "Action: Move to block and capture the player's pawn if it's near rows 4 or 5": self.block_move,
+            "Action: Use two-square move option on the first move if available": self.two_square_move,
+            "Action: Consider en passant move if applicable": self.en_passant_move,
+            "Action: Focus on reaching the other end of the board quickly for a win": self.endgame_move,
+        }
         
+    def reset_game(self):
+        self.board = [['.' for _ in range(8)] for _ in range(8)]
+        self.initialize_board()
+        self.current_player = 'P'
+        self.user_move_history = []
+        self.ai_move_history = []
+        self.player_moves = 1
+        self.en_passant_target = None
+        self.undo_stack = []
+
     def initialize_board(self):
         for i in range(8):
             self.board[0][i] = 'P'
             self.board[1][i] = 'P'
             self.board[6][i] = 'p'
             self.board[7][i] = 'p'
+        self.sync_board()
+
+    def sync_board(self):
+        self.bitboards = {'P': 0, 'p': 0}
+        self.zobrist_hash = 0
+        for x in range(8):
+            for y in range(8):
+                piece = self.board[x][y]
+                if piece != '.':
+                    self.bitboards[piece] |= 1 << (x * 8 + y)
+                    self.zobrist_hash ^= ZOBRIST_KEYS[piece][x * 8 + y]
+
+    def set_square(self, x, y, piece):
+        square = x * 8 + y
+        bit = 1 << square
+        previous = self.board[x][y]
+        if previous != '.':
+            self.bitboards[previous] &= ~bit
+            self.zobrist_hash ^= ZOBRIST_KEYS[previous][square]
+        if piece != '.':
+            self.bitboards[piece] |= bit
+            self.zobrist_hash ^= ZOBRIST_KEYS[piece][square]
+        self.board[x][y] = piece
+
+    def instrument(self, path=None):
+        return Instrumentation(self, path)
+
+    def en_passant_square(self):
+        if self.en_passant_target is None:
+            return None
+        return SQUARE_INDEX[self.en_passant_target]
 
     def display_board(self):
         print("   a b c d e f g h")
@@ -62,9 +1697,14 @@ class BreakthroughBoard:
         print("   a b c d e f g h")
         
     def make_move(self, move_from, move_to):
+        # Squares are 0-63 indices; names such as 'c2', as a player types them, are read here.
         while True:
-            from_x, from_y = self.square_to_coordinates(move_from)
-            to_x, to_y = self.square_to_coordinates(move_to)
+            if isinstance(move_from, str):
+                from_x, from_y = self.square_to_coordinates(move_from)
+                to_x, to_y = self.square_to_coordinates(move_to)
+            else:
+                from_x, from_y = move_from >> 3, move_from & 7
+                to_x, to_y = move_to >> 3, move_to & 7
             piece = self.board[from_x][from_y]
             if piece == '.':
                 print("No piece at that square. Try again.")
@@ -72,7 +1712,10 @@ class BreakthroughBoard:
                 print("Invalid move. Please try again.")
             else:
                 break
-            
+
+            if self.headless:
+                raise ValueError(f"Invalid move {self.coordinates_to_square(from_x, from_y)} to "
+                                 f"{self.coordinates_to_square(to_x, to_y)} for {self.current_player}")
             if self.current_player == self.ai_piece:
                 print("AI made an invalid move. Please debug your AI logic.")
                 raise SystemExit(0)
@@ -83,107 +1726,153 @@ class BreakthroughBoard:
                 print("Player exits. Opponent wins!")
                 break
             
-        move_success = self.update_board_and_check_win(from_x, from_y, to_x, to_y, piece)
-        if move_success:
-            state = self.get_state_representation()
-            action = (move_from, move_to)
-            reward = self.calculate_reward()
-            next_state = self.get_state_representation()
+        state = self.get_state_representation()
+        self.update_board_and_check_win(from_x, from_y, to_x, to_y, piece)
+        action = (from_x * 8 + from_y, to_x * 8 + to_y)
+        reward = self.calculate_reward()
+        self.current_player = 'P' if piece.islower() else 'p'
+        self.current_piece = piece
+        next_state = self.get_state_representation()
+        if self.learning and self.replay_buffer is not None:
+            self.remember(state, action, reward, next_state)
+        elif self.learning:
             q_value = self.get_q_value(state, action)
-            next_max_q = max(self.get_q_values(next_state).values())
+            next_max_q = max(self.get_q_values(next_state).values(), default=0.0)
             updated_q_value = (1 - self.learning_rate) * q_value + \
                               self.learning_rate * (reward + self.discount_factor * next_max_q)
             self.update_q_value(state, action, updated_q_value)
 
-        self.current_player = 'P' if piece.islower() else 'p'
-        self.current_piece = piece
         if self.current_player != self.ai_piece:
-            self.ai_move_history.append((move_from, move_to))
+            self.ai_move_history.append(action)
             self.player_moves += 1
         else:
-            self.user_move_history.append((move_from, move_to))
+            self.user_move_history.append(action)
         if self.check_for_win():
             return True
         return False
     
+    def push(self, move):
+        # Plays move on the board without touching the Q-table or the move histories; pop() undoes it.
+        move_from, move_to = move
+        from_x, from_y = move_from >> 3, move_from & 7
+        to_x, to_y = move_to >> 3, move_to & 7
+        piece = self.board[from_x][from_y]
+        en_passant_capture = piece == 'p' and from_x == 4 and to_x == 5 and abs(from_y - to_y) == 1
+        self.undo_stack.append((move_from, move_to, self.board[to_x][to_y], en_passant_capture,
+                                self.current_player, self.player_moves, self.en_passant_target))
+        if en_passant_capture:
+            self.set_square(4, to_y, '.')
+        self.set_square(to_x, to_y, piece)
+        self.set_square(from_x, from_y, '.')
+        self.current_player = 'P' if piece == 'p' else 'p'
+        if piece == self.ai_piece:
+            self.player_moves += 1
+
+    def pop(self):
+        move_from, move_to, captured, en_passant_capture, current_player, player_moves, en_passant_target = \
+            self.undo_stack.pop()
+        from_x, from_y = move_from >> 3, move_from & 7
+        to_x, to_y = move_to >> 3, move_to & 7
+        self.set_square(from_x, from_y, self.board[to_x][to_y])
+        self.set_square(to_x, to_y, captured)
+        if en_passant_capture:
+            self.set_square(4, to_y, 'P')
+        self.current_player = current_player
+        self.player_moves = player_moves
+        self.en_passant_target = en_passant_target
+        return move_from, move_to
+
     def update_board_and_check_win(self, from_x, from_y, to_x, to_y, piece):
         if piece.islower() and from_x == 4 and to_x == 5 and abs(from_y - to_y) == 1:
             captured_pawn_square = self.coordinates_to_square(4, to_y)
-            self.board[4][to_y] = '.'
-            print(f"En passant! {self.current_player}'s pawn captures {captured_pawn_square}")
-        self.board[to_x][to_y] = piece
-        self.board[from_x][from_y] = '.'
+            self.set_square(4, to_y, '.')
+            if not self.headless:
+                print(f"En passant! {self.current_player}'s pawn captures {captured_pawn_square}")
+        self.set_square(to_x, to_y, piece)
+        self.set_square(from_x, from_y, '.')
         current_pawns, opponent_pawns = self.find_closest_pawns()
         if (to_x, to_y) in current_pawns:
-            print(f"Game over! A {self.current_player} pawn reached the opponent's end. {self.current_player} wins!")
+            if not self.headless:
+                print(f"Game over! A {self.current_player} pawn reached the opponent's end. {self.current_player} wins!")
             return True
-        self.display_en_passant_target()
+        if not self.headless:
+            self.display_en_passant_target()
         return False
     
+    def q_key(self, state, action):
+        # With mirror_states on, a position and its left-right mirror share one entry, stored
+        # under whichever of the two state keys sorts first.
+        if self.mirror_states:
+            mirrored = mirror_state(state)
+            if mirrored < state:
+                return mirrored, mirror_action(action)
+        return state, action
+
     def get_q_value(self, state, action):
-        return self.q_table.get((state, action), 0.0)
+        return self.q_table.get(self.q_key(state, action), 0.0)
 
-    def get_q_values(self, state):
-        return {action: self.get_q_value(state, action) for action in self.get_valid_moves()}
+    def get_q_values(self, state, moves=None):
+        if moves is None:
+            moves = self.get_valid_moves()
+        if self.mirror_states:
+            mirrored = mirror_state(state)
+            if mirrored < state:
+                return {move: self.q_table.get((mirrored, mirror_action(move)), 0.0) for move in moves}
+        return {move: self.q_table.get((state, move), 0.0) for move in moves}
 
     def update_q_value(self, state, action, value):
-        self.q_table[(state, action)] = value
+        key = self.q_key(state, action)
+        self.q_table[key] = value
+        if self.q_visits is not None:
+            self.q_visits[key] = self.q_visits.get(key, 0) + 1
         
+    def remember(self, state, action, reward, next_state):
+        state, action = self.q_key(state, action)
+        next_keys = [self.q_key(next_state, move) for move in self.get_valid_moves()]
+        canonical_next_state = next_keys[0][0] if next_keys else next_state
+        self.replay_buffer.add(state, encode_action(action), reward, canonical_next_state, self.winner() is not None,
+                               [encode_action(next_action) for _, next_action in next_keys])
+
+    def replay(self, batches=1):
+        for _ in range(batches):
+            states, actions = self.replay_buffer.update(self.q_table, self.replay_buffer.sample(),
+                                                        self.learning_rate, self.discount_factor)
+            if self.q_visits is not None:
+                for state, action in zip(states.tolist(), actions.tolist()):
+                    self.q_visits[state, action] = self.q_visits.get((state, action), 0) + 1
+
     def is_valid_move(self, from_x, from_y, to_x, to_y, piece):
         if to_x < 0 or to_x >= 8 or to_y < 0 or to_y >= 8:
             return False
-            
-        if piece.islower():
-            if from_x - to_x == 1 and from_y == to_y and self.board[to_x][to_y] == '.':
-                return True
-            if from_x - to_x == 2 and from_y == to_y and from_x == 6 and to_x == 4 and self.board[to_x][to_y] == '.' and self.board[to_x + 1][to_y] == '.':
-                return True
-            elif from_x - to_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].isupper():
-                return True
-            if from_x - to_x == 2 and from_y == to_y and from_x == 7 and to_x == 5 and self.board[to_x][to_y] == '.' and self.board[to_x + 1][to_y] == '.':
-                return True
-            elif from_x - to_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].isupper():
-                return True
-            if from_x == 4 and to_x == 5 and abs(from_y - to_y) == 1 and self.en_passant_target == self.coordinates_to_square(5, to_y):
-                return True
-            
-        elif piece.isupper():
-            if to_x - from_x == 1 and from_y == to_y and self.board[to_x][to_y] == '.':
-                return True
-            if to_x - from_x == 2 and from_y == to_y and from_x == 1 and to_x == 3 and self.board[to_x][to_y] == '.' and self.board[to_x - 1][to_y] == '.':
-                return True
-            elif to_x - from_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].islower():
-                return True
-            if to_x - from_x == 2 and from_y == to_y and from_x == 0 and to_x == 2 and self.board[to_x][to_y] == '.' and self.board[to_x - 1][to_y] == '.':
-                return True
-            elif to_x - from_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].islower():
-                return True
-            if from_x == 3 and to_x == 2 and abs(from_y - to_y) == 1 and self.en_passant_target == self.coordinates_to_square(2, to_y):
-                return True
-        return False
+        if not piece.isalpha():
+            return False
+        targets = pawn_target_mask(from_x * 8 + from_y, 'p' if piece.islower() else 'P',
+                                   self.bitboards['P'], self.bitboards['p'], self.en_passant_square())
+        return bool(targets >> (to_x * 8 + to_y) & 1)
 
     def display_en_passant_target(self):
         if self.en_passant_target:
             print(f"En passant target square: {self.en_passant_target}")
 
     def square_to_coordinates(self, square):
+        index = SQUARE_INDEX.get(square)
+        if index is not None:
+            return index >> 3, index & 7
         column, row = square[0], int(square[1])
         return row - 1, ord(column) - ord('a')
 
     def is_game_over(self):
-        player_pawn = 'P'
         opponent_pawn = 'p'
-        for row in self.board:
-            if player_pawn in row or opponent_pawn in row:
-                return False
-        print(f"Game over! No {opponent_pawn} pawns left. {self.current_player} wins!")
+        if self.bitboards['P'] or self.bitboards['p']:
+            return False
+        if not self.headless:
+            print(f"Game over! No {opponent_pawn} pawns left. {self.current_player} wins!")
         return True
 
     def get_state_representation(self):
-        state = ""
-        for row in self.board:
-            state += "".join(row)
-        return state
+        if self.current_player == self.ai_piece:
+            return self.zobrist_hash ^ SIDE_TO_MOVE_KEY
+        return self.zobrist_hash
     
     def calculate_reward(self):
         current_pawns, opponent_pawns = self.find_closest_pawns()
@@ -194,91 +1883,91 @@ class BreakthroughBoard:
         captured_pawns = set(opponent_pawns) - set(self.find_closest_pawns()[1])
         return len(captured_pawns) * 0.5
 
+    def take_ai_turn(self):
+        # Returns False, without moving, when the AI has no legal move and so has lost.
+        if self.ai_agent is None:
+            moved = self.ai_make_move()
+        else:
+            move = self.book_move() or self.tablebase_move() or self.ai_agent.choose_move(self)
+            moved = move is not None
+            if moved:
+                self.make_move(*move)
+        if not moved and not self.headless:
+            print("Game over! AI Agent has no legal move. Player wins!")
+        return moved
+
+    def book_move(self):
+        if self.opening_book is None:
+            return None
+        return self.opening_book.probe(self.get_state_representation())
+
+    def tablebase_move(self):
+        tablebase = self.endgame_tablebase
+        if tablebase is None or not tablebase.covers(self.bitboards['P'], self.bitboards['p']):
+            return None
+        return tablebase.best_move(self.bitboards['P'], self.bitboards['p'], self.current_player)
+
     def ai_make_move(self):
-        legal_moves = self.get_valid_moves()
+        precomputed_move = self.book_move() or self.tablebase_move()
+        if precomputed_move is not None:
+            self.make_move(*precomputed_move)
+            return True
+        moves = self.get_valid_moves()
+        if not moves:
+            return False
         current_state = self.get_state_representation()
-        for move in legal_moves:
-            move_from_x, move_from_y = self.square_to_coordinates(move[0])
-            move_to_x, move_to_y = self.square_to_coordinates(move[1])
-            if move_from_x == 6 and move_to_x == 5 and abs(move_from_y - move_to_y) == 1:
-                self.make_move(move[0], move[1])
-                return
-        q_values = {move: self.get_q_value(current_state, move) for move in legal_moves}
+        for move_from, move_to in moves:
+            if move_from >> 3 == 6 and move_to >> 3 == 5 and move_to != move_from - 8:
+                self.make_move(move_from, move_to)
+                return True
+        q_values = self.get_q_values(current_state, moves)
         move_to_make = max(q_values, key=q_values.get)
-        move_from_x, move_from_y = self.square_to_coordinates(move_to_make[0])
-        move_to_x, move_to_y = self.square_to_coordinates(move_to_make[1])
-    
-        percepts = {
-            "AI's Turn": True,
-            "Positions of AI's Pawns Closest to Opponent's Home Row": [(6, 0), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), (6, 6), (6, 7),
-                                                                      (7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7)],
-            "Positions of Player's Pawns Closest to AI's Home Row": self.find_closest_pawns()[1],
-            "Available Legal Moves for AI": legal_moves,
-            "Forward Movement Only": True,
-            "Two-Square First Move": True if self.player_moves <= 2 and move_from_x in [6, 7] else False,
-            "Current Position of All Pieces": self.board,
-            "Whose Turn It Is": self.current_player,
-        }
-    
-        action = self.determine_action(percepts)
-        if action == "Action: Move pawn closer to opponent's home row":
-            self.make_move(move_to_make[0], move_to_make[1])
-        elif action == "Action: Move to capture opponent's pawn if possible":
-            target_x, target_y = self.find_best_opponent_pawn_capture(move_to_x, move_to_y)
-            if target_x is not None and target_y is not None:
-                target_square = self.coordinates_to_square(target_x, target_y)
-                self.make_move(move_to_make[0], target_square)
-        elif action == "Action: Move to block and capture the player's pawn if it's near rows 4 or 5":
-            player_pawns_near_middle = any((row in [3, 4] for row, _ in self.find_closest_pawns()[1]))
-            if player_pawns_near_middle:
-                self.make_move(move_to_make[0], move_to_make[1])
-        elif action == "Action: Use two-square move option on the first move if available":
-            if self.player_moves <= 2 and move_from_x in [6, 7]:
-                self.make_move(move_to_make[0], move_to_make[1])
-        elif action == "Action: Consider en passant move if applicable":
-            en_passant_target_square = self.check_en_passant(move_to_x, move_to_y)
-            if en_passant_target_square:
-                self.make_move(move_to_make[0], en_passant_target_square)
-        elif action == "Action: Focus on reaching the other end of the board quickly for a win":
-            if self.player_moves >= 60:
-                self.make_move(move_to_make[0], move_to_make[1])
-        else:
-            self.make_move(move_to_make[0], move_to_make[1])
+        action = self.determine_action(self.turn_percepts())
+        self.action_handlers.get(action, self.play_move)(*move_to_make)
+        return True
+
+    def turn_percepts(self):
+        player, ai = self.bitboards['P'], self.bitboards['p']
+        ai_row_6 = ai & ROW_MASKS[6]
+        percepts = 0
+        if (((ai_row_6 & ~FILE_H) >> 7) | ((ai_row_6 & ~FILE_A) >> 9)) & player:
+            percepts |= PERCEPT_CAPTURE
+        # find_closest_pawns reports the AI's pawns on row 7, which are never near the middle.
+        if ai & ROW_MASKS[7]:
+            percepts |= PERCEPT_NEAR_END
+        if self.player_moves >= 60:
+            percepts |= PERCEPT_ENDGAME
+        return percepts
 
     def determine_action(self, percepts):
-        if np.random.rand() < self.exploration_prob:
+        if self.rng.rand() < self.exploration_prob:
             return "Explore"
-        ai_turn = percepts["AI's Turn"]
-        player_pawns_near_middle = any((row in [3, 4] for row, _ in percepts["Positions of Player's Pawns Closest to AI's Home Row"]))
-        player_pawns_near_end = any((row in [6, 7] for row, _ in percepts["Positions of Player's Pawns Closest to AI's Home Row"]))
-        available_legal_moves = percepts["Available Legal Moves for AI"]
-        for move in available_legal_moves:
-            move_from_x, move_from_y = self.square_to_coordinates(move[0])
-            move_to_x, move_to_y = self.square_to_coordinates(move[1])
-            if move_from_x == 6 and move_to_x == 5 and abs(move_from_y - move_to_y) == 1:
-                return "Action: Move to capture opponent's pawn if possible"
-        if player_pawns_near_middle:
-            return "Action: Move to block and capture the player's pawn if it's near rows 4 or 5"
-        elif player_pawns_near_end:
-            if available_legal_moves:
-                best_capture = self.find_best_opponent_pawn_capture(available_legal_moves[0][0], available_legal_moves[0][1])
-                if best_capture:
-                    return "Action: Move to capture opponent's pawn if possible"
-        elif self.player_moves >= 60:
-            return "Action: Focus on reaching the other end of the board quickly for a win"
-        current_state = self.get_state_representation()
-        legal_moves = self.get_valid_moves()
-        q_values = {move: self.get_q_value(current_state, move) for move in legal_moves}
-        best_move = max(q_values, key=q_values.get)
-        action_mapping = {
-            "Action: Move pawn closer to opponent's home row": "MoveCloser",
-            "Action: Move to capture opponent's pawn if possible": "Capture",
-            "Action: Move to block and capture the player's pawn if it's near rows 4 or 5": "BlockCapture",
-            "Action: Use two-square move option on the first move if available": "TwoSquareMove",
-            "Action: Consider en passant move if applicable": "EnPassant",
-            "Action: Focus on reaching the other end of the board quickly for a win": "EndgameFocus",
-        }
-        return action_mapping.get(best_move, "Default Action")
+        return self.decision_index[percepts]
+
+    def play_move(self, move_from, move_to):
+        self.make_move(move_from, move_to)
+
+    def capture_toward_pawn(self, move_from, move_to):
+        target_x, target_y = self.find_best_opponent_pawn_capture(move_to >> 3, move_to & 7)
+        if target_x is not None and target_y is not None:
+            self.make_move(move_from, target_x * 8 + target_y)
+
+    def block_move(self, move_from, move_to):
+        if any((row in [3, 4] for row, _ in self.find_closest_pawns()[1])):
+            self.play_move(move_from, move_to)
+
+    def two_square_move(self, move_from, move_to):
+        if self.player_moves <= 2 and move_from >> 3 in [6, 7]:
+            self.play_move(move_from, move_to)
+
+    def en_passant_move(self, move_from, move_to):
+        en_passant_target_square = self.check_en_passant(move_to >> 3, move_to & 7)
+        if en_passant_target_square:
+            self.make_move(move_from, SQUARE_INDEX[en_passant_target_square])
+
+    def endgame_move(self, move_from, move_to):
+        if self.player_moves >= 60:
+            self.play_move(move_from, move_to)
  
     def find_best_opponent_pawn_capture(self, current_x, current_y):
         opponent_pawns = self.find_closest_pawns()[1]
@@ -293,67 +1982,59 @@ class BreakthroughBoard:
         return best_capture
     
     def get_valid_moves(self):
-        valid_moves = []
-        player_piece = 'p'
-        move_direction = -1
-        for i in range(8):
-            for j in range(8):
-                if self.board[i][j] == player_piece:
-                    if self.is_valid_move(i, j, i + move_direction, j, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j)))
-                    if self.is_valid_move(i, j, i + move_direction, j + 1, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j + 1)))
-                    if self.is_valid_move(i, j, i + move_direction, j - 1, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j - 1)))
-        return valid_moves
+        return generate_bitboard_moves(self.bitboards['P'], self.bitboards['p'], 'p', double_steps=False)
+
+    def get_legal_moves(self, piece):
+        return generate_bitboard_moves(self.bitboards['P'], self.bitboards['p'], piece, self.en_passant_square())
 
     def coordinates_to_square(self, x, y):
         column = chr(y + ord('a'))
         row = str(x + 1)
         return column + row
 
+    def winner(self):
+        if self.bitboards['P'] & ROW_MASKS[7]:
+            return 'P'
+        if self.bitboards['p'] & ROW_MASKS[0]:
+            return 'p'
+        return None
+
     def check_for_win(self):
-        for col in range(8):
-            if self.board[7][col] == 'P':
-                self.display_user_move_history()
-                self.display_board()
-                print(f"Game over! A player's pawn reached the last row. Player wins!")
-                raise SystemExit(0)
-                return True
-        for col in range(8):
-            if self.board[0][col] == 'p':
-                self.display_ai_move_history()
-                self.display_board()
-                print(f"Game over! AI's pawn reached the first row. AI Agent wins!")
-                raise SystemExit(0)
-                return True
-        return False
+        winner = self.winner()
+        if winner is None:
+            return False
+        if self.headless:
+            return True
+        if winner == 'P':
+            self.display_user_move_history()
+            self.display_board()
+            print(f"Game over! A player's pawn reached the last row. Player wins!")
+        else:
+            self.display_ai_move_history()
+            self.display_board()
+            print(f"Game over! AI's pawn reached the first row. AI Agent wins!")
+        raise SystemExit(0)
 
     def find_closest_pawns(self):
-        current_home_row = 0 
+        current_home_row = 0
         opponent_home_row = 7
-        current_pawns = []
-        opponent_pawns = []
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece == 'P' and row == current_home_row:
-                    current_pawns.append((row, col))
-                elif piece == 'p' and row == opponent_home_row:
-                    opponent_pawns.append((row, col))
+        current_pawns = [(current_home_row, square & 7)
+                         for square in iter_bits(self.bitboards['P'] & ROW_MASKS[current_home_row])]
+        opponent_pawns = [(opponent_home_row, square & 7)
+                          for square in iter_bits(self.bitboards['p'] & ROW_MASKS[opponent_home_row])]
         return current_pawns, opponent_pawns
 
     def display_user_move_history(self):
         print("User Move History:")
         for i, move in enumerate(self.user_move_history, start=1):
             move_from, move_to = move
-            print(f"{i}. {move_from} to {move_to}")
+            print(f"{i}. {SQUARE_NAMES[move_from]} to {SQUARE_NAMES[move_to]}")
 
     def display_ai_move_history(self):
         print("AI Move History:")
         for i, move in enumerate(self.ai_move_history, start=1):
             move_from, move_to = move
-            print(f"{i}. {move_from} to {move_to}")
+            print(f"{i}. {SQUARE_NAMES[move_from]} to {SQUARE_NAMES[move_to]}")
 
     def is_valid_input(self, move):
         if len(move) != 2:
@@ -372,7 +2053,8 @@ class BreakthroughBoard:
         while not self.is_game_over():
             self.display_board()
             if ai_turn:
-                self.ai_make_move()
+                if not self.take_ai_turn():
+                    break
                 self.display_ai_move_history()
             else:
                 print(f"Player's turn (Turn {self.player_moves}).")
@@ -404,6 +2086,286 @@ class BreakthroughBoard:
         if self.is_game_over():
             return
         
+    def q_opponent_move(self):
+        legal_moves = self.get_legal_moves('P')
+        if self.rng.rand() < self.exploration_prob:
+            return legal_moves[self.rng.randint(len(legal_moves))]
+        current_state = self.get_state_representation()
+        q_values = self.get_q_values(current_state, legal_moves)
+        return max(q_values, key=q_values.get)
+
+    def random_opponent_move(self):
+        legal_moves = self.get_legal_moves('P')
+        return legal_moves[self.rng.randint(len(legal_moves))]
+
+    def play_headless_game(self, opponent='self'):
+        if opponent == 'self':
+            opponent = BreakthroughBoard.q_opponent_move
+        elif opponent == 'random':
+            opponent = BreakthroughBoard.random_opponent_move
+        self.reset_game()
+        plies = 0
+        while True:
+            mover = self.current_player
+            if mover == self.ai_piece:
+                if not (self.get_valid_moves() if self.ai_agent is None else self.get_legal_moves(mover)):
+                    return 'P', plies
+                self.take_ai_turn()
+            else:
+                if not self.get_legal_moves('P'):
+                    return self.ai_piece, plies
+                self.make_move(*opponent(self))
+            if self.current_player == mover:
+                raise RuntimeError(f"{mover} did not make a move")
+            plies += 1
+            winner = self.winner()
+            if winner is not None:
+                return winner, plies
+
+    def simulate_games(self, n_games, opponent='self', seed=None):
+        # Plays n_games headless games, AI ('p') against the given opponent, which is 'self' for the
+        # Q-table playing both sides, 'random', or a function taking the board and returning a move.
+        headless = self.headless
+        self.headless = True
+        if seed is not None:
+            self.rng = np.random.RandomState(seed)
+        results = []
+        plies = 0
+        start = time.perf_counter()
+        try:
+            for _ in range(n_games):
+                winner, game_plies = self.play_headless_game(opponent)
+                if self.replay_buffer is not None and self.learning:
+                    self.replay(self.replay_buffer.due_batches())
+                if self.game_writer is not None:
+                    self.game_writer.write_game(self.game_moves(), winner)
+                results.append(winner)
+                plies += game_plies
+        finally:
+            self.headless = headless
+        seconds = time.perf_counter() - start
+        return {
+            "games": n_games,
+            "wins": {'P': results.count('P'), 'p': results.count('p')},
+            "plies": plies,
+            "seconds": seconds,
+            "games_per_second": n_games / seconds if seconds > 0 else float('inf'),
+            "results": results,
+        }
+
+    def game_moves(self):
+        plies = len(self.user_move_history) + len(self.ai_move_history)
+        histories = (self.user_move_history, self.ai_move_history)
+        return [histories[ply % 2][ply // 2] for ply in range(plies)]
+
+    def train_from_records(self, path, limit=None):
+        # Replays stored games through make_move, so the Q-table learns from them as if they had
+        # just been played, without simulating them again.
+        headless = self.headless
+        self.headless = True
+        games = plies = 0
+        start = time.perf_counter()
+        try:
+            for _, moves in read_game_records(path):
+                if limit is not None and games >= limit:
+                    break
+                self.reset_game()
+                for move_from, move_to in moves:
+                    self.make_move(move_from, move_to)
+                if self.replay_buffer is not None and self.learning:
+                    self.replay(self.replay_buffer.due_batches())
+                games += 1
+                plies += len(moves)
+        finally:
+            self.headless = headless
+        seconds = time.perf_counter() - start
+        return {
+            "games": games,
+            "plies": plies,
+            "seconds": seconds,
+            "plies_per_second": plies / seconds if seconds > 0 else float('inf'),
+        }
+
+    def train_parallel(self, n_games, workers=None, merge_every=100, opponent='self', seed=0):
+        # Each worker trains its own copy of q_table for merge_every games, then the copies are folded
+        # back into q_table by visit-weighted averaging before the next round starts. One pool serves
+        # every round: its processes keep the table as it was at the start, and each job carries the
+        # values merged since then, so any process can take any job.
+        workers = workers or os.cpu_count() or 1
+        settings = (self.learning_rate, self.discount_factor, self.exploration_prob, self.mirror_states, opponent)
+        if self.q_visits is None:
+            self.q_visits = {}
+        wins = {'P': 0, 'p': 0}
+        plies = 0
+        games_played = 0
+        rounds = 0
+        merged = {}
+        start = time.perf_counter()
+        processes = max(1, min(workers, -(-n_games // merge_every)))
+        with multiprocessing.Pool(processes, initializer=_init_training_worker,
+                                  initargs=(self.q_table, settings)) as pool:
+            while games_played < n_games:
+                jobs = []
+                for worker in range(workers):
+                    games = min(merge_every, n_games - games_played - merge_every * worker)
+                    if games > 0:
+                        jobs.append((games, seed + rounds * workers + worker, merged))
+                outcomes = pool.map(_run_training_worker, jobs, chunksize=1)
+                self.merge_q_tables([updates for updates, _ in outcomes])
+                for updates, result in outcomes:
+                    for key in updates:
+                        merged[key] = self.q_table[key]
+                    wins['P'] += result["wins"]['P']
+                    wins['p'] += result["wins"]['p']
+                    plies += result["plies"]
+                    games_played += result["games"]
+                rounds += 1
+        seconds = time.perf_counter() - start
+        return {
+            "games": games_played,
+            "wins": wins,
+            "plies": plies,
+            "rounds": rounds,
+            "workers": workers,
+            "seconds": seconds,
+            "games_per_second": games_played / seconds if seconds > 0 else float('inf'),
+        }
+
+    def merge_q_tables(self, worker_updates):
+        totals = {}
+        for updates in worker_updates:
+            for key, (value, visits) in updates.items():
+                weighted, count = totals.get(key, (0.0, 0))
+                totals[key] = (weighted + value * visits, count + visits)
+        for key, (weighted, count) in totals.items():
+            self.q_table[key] = weighted / count
+            self.q_visits[key] = self.q_visits.get(key, 0) + count
+
+
+class LinearQBoard(BreakthroughBoard):
+    # Q(s, a) = features(s, a) . weights instead of a table entry, so memory stays constant and
+    # unseen positions are scored from what similar ones taught. Features are seen from the
+    # moving side and extracted for all candidate moves at once; make_move computes the played
+    # move's features on the board before it changes, since the state keys are only hashes.
+    FEATURES = ("bias", "advancement", "capture", "winning_move", "attacked", "defended", "hanging", "threats",
+                "double_step", "material", "opponent_progress", "leaves_home_row")
+
+    def __init__(self, *args, weights=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.weights = np.zeros(len(self.FEATURES)) if weights is None else np.asarray(weights, dtype=float)
+        self.pending = None
+
+    def move_features(self, moves):
+        origins = np.array([move[0] for move in moves], dtype=np.uint64)
+        targets = np.array([move[1] for move in moves], dtype=np.uint64)
+        features = np.zeros((len(moves), len(self.FEATURES)))
+        if not len(moves):
+            return features
+        one = np.uint64(1)
+        player_mask, ai_mask = self.bitboards['P'], self.bitboards['p']
+        piece = 'P' if player_mask >> int(origins[0]) & 1 else 'p'
+        own, opponent = (player_mask, ai_mask) if piece == 'P' else (ai_mask, player_mask)
+        if piece == 'P':
+            opponent_attacks = ((opponent & ~FILE_A) >> 9) | ((opponent & ~FILE_H) >> 7)
+            rows = (targets >> np.uint64(3)).astype(np.int64)
+            progress, goal_row, home_rows = rows, 7, ROW_MASKS[0]
+            opponent_rows = [x for x in range(8) if opponent & ROW_MASKS[x]]
+            opponent_progress = (7 - min(opponent_rows)) / 7 if opponent_rows else 0.0
+        else:
+            opponent_attacks = (((opponent & ~FILE_H) << 9) | ((opponent & ~FILE_A) << 7)) & FULL_MASK
+            rows = (targets >> np.uint64(3)).astype(np.int64)
+            progress, goal_row, home_rows = 7 - rows, 0, ROW_MASKS[7]
+            opponent_rows = [x for x in range(8) if opponent & ROW_MASKS[x]]
+            opponent_progress = max(opponent_rows) / 7 if opponent_rows else 0.0
+        target_bits = one << targets
+        own_after = (np.uint64(own) & ~(one << origins)) | target_bits
+        not_file_a, not_file_h = np.uint64(~FILE_A & FULL_MASK), np.uint64(~FILE_H & FULL_MASK)
+        if piece == 'P':
+            own_attacks = ((own_after & not_file_h) << np.uint64(9)) | ((own_after & not_file_a) << np.uint64(7))
+            target_attacks = ((target_bits & not_file_h) << np.uint64(9)) | ((target_bits & not_file_a) << np.uint64(7))
+        else:
+            own_attacks = ((own_after & not_file_a) >> np.uint64(9)) | ((own_after & not_file_h) >> np.uint64(7))
+            target_attacks = ((target_bits & not_file_a) >> np.uint64(9)) | ((target_bits & not_file_h) >> np.uint64(7))
+        capture = (np.uint64(opponent) & target_bits) != 0
+        attacked = (np.uint64(opponent_attacks) & target_bits) != 0
+        defended = (own_attacks & target_bits) != 0
+        threats = popcount_array(target_attacks & np.uint64(opponent) & ~target_bits).astype(float)
+        material = own.bit_count() - opponent.bit_count() + capture
+        features[:, 0] = 1.0
+        features[:, 1] = progress / 7
+        features[:, 2] = capture
+        features[:, 3] = rows == goal_row
+        features[:, 4] = attacked
+        features[:, 5] = defended
+        features[:, 6] = attacked & ~defended
+        features[:, 7] = threats / 2
+        features[:, 8] = np.abs(targets.astype(np.int64) - origins.astype(np.int64)) == 16
+        features[:, 9] = material / 16
+        features[:, 10] = opponent_progress
+        features[:, 11] = (np.uint64(home_rows) & (one << origins)) != 0
+        return features
+
+    def make_move(self, move_from, move_to):
+        self.pending = ((move_from, move_to), self.move_features([(move_from, move_to)])[0])
+        try:
+            return super().make_move(move_from, move_to)
+        finally:
+            self.pending = None
+
+    def get_q_value(self, state, action):
+        if self.pending is not None and self.pending[0] == action:
+            return float(self.pending[1] @ self.weights)
+        return float(self.move_features([action])[0] @ self.weights)
+
+    def get_q_values(self, state, moves=None):
+        if moves is None:
+            moves = self.get_valid_moves()
+        return dict(zip(moves, (self.move_features(moves) @ self.weights).tolist()))
+
+    def update_q_value(self, state, action, value):
+        # Normalized LMS step moving this move's estimate to the make_move target value.
+        if self.pending is None or self.pending[0] != action:
+            return
+        features = self.pending[1]
+        error = value - features @ self.weights
+        self.weights += error * features / (features @ features)
+
+
+_training_board = None
+_training_master = None
+
+
+def _init_training_worker(q_table, settings):
+    # The master table is kept apart from the board, so every job in this process starts from it,
+    # plus the values merged so far, and not from the table a previous job trained.
+    global _training_board, _training_master
+    learning_rate, discount_factor, exploration_prob, mirror_states, opponent = settings
+    _training_board = BreakthroughBoard(learning_rate, discount_factor, exploration_prob, headless=True,
+                                        mirror_states=mirror_states)
+    _training_master = q_table
+    _training_board.opponent = opponent
+
+
+def _run_training_worker(job):
+    games, seed, merged = job
+    board = _training_board
+    board.q_table = _training_master.copy()
+    for key, value in merged.items():
+        board.q_table[key] = value
+    board.q_visits = {}
+    result = board.simulate_games(games, opponent=board.opponent, seed=seed)
+    del result["results"]
+    updates = {key: (board.q_table[key], visits) for key, visits in board.q_visits.items()}
+    return updates, result
+
 if __name__ == "__main__":
-    breakthrough_board = BreakthroughBoard(learning_rate=0.2, discount_factor=0.8, exploration_prob=0.2)
-    breakthrough_board.play_game()
+    q_table_path = sys.argv[1] if len(sys.argv) > 1 else None
+    q_table = CompactQTable.load(q_table_path) if q_table_path and os.path.exists(q_table_path) else None
+    opening_book = OpeningBook.load(sys.argv[2]) if len(sys.argv) > 2 else None
+    breakthrough_board = BreakthroughBoard(learning_rate=0.2, discount_factor=0.8, exploration_prob=0.2, q_table=q_table,
+                                           opening_book=opening_book)
+    try:
+        breakthrough_board.play_game()
+    finally:
+        if q_table_path:
+            save_q_table(breakthrough_board.q_table, q_table_path)
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import random
+import signal
+import sys
+import time
+
+import numpy as np
+
+import q_learning
+
+
+# Line protocol, one command per line; the server answers each with one line (BOARD with nine).
+#   MOVES              -> MOVES a2a3 a2b3 ...   the player's legal moves
+#   MOVE a2 a3         -> OK d7 d6              the AI's reply
+#                      -> OVER P | OVER p d2 d1 game over, with the AI's winning move if it made one
+#   NEW                -> READY <session>       start a new game
+#   BOARD              -> 8 board lines, then END
+#   STATS              -> STATS {json}          this session's move latencies
+#   QUIT               -> BYE
+# Errors answer ERR <reason> and leave the session as it was.
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p99_ms": None}
+    values = np.array(samples) * 1000
+    return {"count": len(samples), "p50_ms": float(np.percentile(values, 50)),
+            "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+
+
+class GameSession:
+    session_ids = itertools.count(1)
+
+    def __init__(self, q_table, exploration_prob):
+        self.id = next(self.session_ids)
+        self.board = q_learning.BreakthroughBoard(exploration_prob=exploration_prob, headless=True, q_table=q_table)
+        self.board.learning = False
+        self.board.rng = np.random.RandomState(self.id)
+        self.latencies = collections.deque(maxlen=10000)
+        self.over = False
+
+    def new_game(self):
+        self.board.reset_game()
+        self.over = False
+
+    def finished(self):
+        # The winner, counting a side left without a legal move as beaten.
+        board = self.board
+        winner = board.winner()
+        if winner is None and not board.get_legal_moves(board.current_player):
+            winner = 'p' if board.current_player == 'P' else 'P'
+        self.over = winner is not None
+        return winner
+
+
+class GameServer:
+    def __init__(self, q_table=None, exploration_prob=0.0, workers=None, game_writer=None):
+        # One Q-table for every session: MmapQTable pages are shared and sessions never write.
+        self.q_table = q_table if q_table is not None else {}
+        self.exploration_prob = exploration_prob
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.sessions = {}
+        self.latencies = collections.deque(maxlen=100000)
+        # Finished games are appended from the event loop thread only, so one writer serves all.
+        self.game_writer = game_writer
+
+    async def handle(self, reader, writer):
+        session = GameSession(self.q_table, self.exploration_prob)
+        self.sessions[session.id] = session
+        writer.write(f"READY {session.id}\n".encode())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, *arguments = line.decode().split() or [""]
+                command = command.upper()
+                if command == "QUIT":
+                    writer.write(b"BYE\n")
+                    break
+                writer.write((await self.respond(session, command, arguments)).encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.sessions[session.id]
+            writer.close()
+
+    async def respond(self, session, command, arguments):
+        board = session.board
+        if command == "MOVES":
+            return "MOVES " + " ".join(q_learning.SQUARE_NAMES[move_from] + q_learning.SQUARE_NAMES[move_to]
+                                       for move_from, move_to in board.get_legal_moves('P')) + "\n"
+        if command == "NEW":
+            session.new_game()
+            return f"READY {session.id}\n"
+        if command == "BOARD":
+            rows = ["".join(board.board[x]) for x in range(7, -1, -1)]
+            return "\n".join(rows) + "\nEND\n"
+        if command == "STATS":
+            stats = {"session": session.id, "latency": percentiles(list(session.latencies)),
+                     "sessions": len(self.sessions), "server_latency": percentiles(list(self.latencies))}
+            return "STATS " + json.dumps(stats) + "\n"
+        if command != "MOVE":
+            return f"ERR unknown command {command}\n"
+        if len(arguments) != 2 or not all(board.is_valid_input(square) for square in arguments):
+            return "ERR usage: MOVE <from> <to>\n"
+        if session.over:
+            return "ERR game over, send NEW\n"
+        if board.current_player != 'P':
+            return "ERR not your turn\n"
+        move = tuple(q_learning.SQUARE_INDEX[square.lower()] for square in arguments)
+        if move not in board.get_legal_moves('P'):
+            return "ERR invalid move\n"
+        start = time.perf_counter()
+        board.make_move(*move)
+        winner = session.finished()
+        if winner is not None:
+            self.record_game(session, winner)
+            return f"OVER {winner}\n"
+        await asyncio.get_running_loop().run_in_executor(self.executor, board.take_ai_turn)
+        move_from, move_to = (q_learning.SQUARE_NAMES[square] for square in board.ai_move_history[-1])
+        latency = time.perf_counter() - start
+        session.latencies.append(latency)
+        self.latencies.append(latency)
+        winner = session.finished()
+        if winner is not None:
+            self.record_game(session, winner)
+            return f"OVER {winner} {move_from} {move_to}\n"
+        return f"OK {move_from} {move_to}\n"
+
+    def record_game(self, session, winner):
+        if self.game_writer is not None:
+            self.game_writer.write_game(session.board.game_moves(), winner)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 16, backlog=4096)
+        print(f"serving on {host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+async def play_client(host, port, games, seed, latencies):
+    # Plays random legal moves for the player and times each MOVE round trip.
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()
+    finished = 0
+    while finished < games:
+        writer.write(b"MOVES\n")
+        moves = (await reader.readline()).decode().split()[1:]
+        move = rng.choice(moves)
+        start = time.perf_counter()
+        writer.write(f"MOVE {move[:2]} {move[2:]}\n".encode())
+        reply = (await reader.readline()).decode().split()
+        latencies.append(time.perf_counter() - start)
+        if reply[0] == "OVER":
+            finished += 1
+            writer.write(b"NEW\n")
+            await reader.readline()
+        elif reply[0] != "OK":
+            raise RuntimeError(f"unexpected reply {' '.join(reply)}")
+    writer.write(b"QUIT\n")
+    await reader.readline()
+    writer.close()
+
+
+async def load_test(host, port, sessions, games, seed):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(play_client(host, port, games, seed + index, latencies) for index in range(sessions)))
+    seconds = time.perf_counter() - start
+    report = percentiles(latencies)
+    report.update({"sessions": sessions, "games": sessions * games, "seconds": seconds,
+                   "moves_per_second": len(latencies) / seconds if seconds > 0 else 0.0})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asyncio Breakthrough game server and load-test client.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="host game sessions over TCP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--q-table", help="trained Q-table file, memory-mapped once and shared by all sessions")
+    serve.add_argument("--exploration-prob", type=float, default=0.0)
+    serve.add_argument("--workers", type=int, default=None, help="executor threads for AI moves")
+    serve.add_argument("--record", help="append every finished game to this game record file")
+    load = commands.add_parser("load-test", help="play many concurrent sessions and report move latency")
+    load.add_argument("--host", default="127.0.0.1")
+    load.add_argument("--port", type=int, default=8765)
+    load.add_argument("--sessions", type=int, default=100)
+    load.add_argument("--games", type=int, default=1, help="games per session")
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        q_table = q_learning.MmapQTable(args.q_table) if args.q_table else None
+        game_writer = q_learning.GameRecordWriter(args.record) if args.record else None
+        server = GameServer(q_table, args.exploration_prob, args.workers, game_writer)
+        # SIGTERM stops the server like Ctrl-C, so the record file is closed either way.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if game_writer is not None:
+                game_writer.close()
+    else:
+        report = asyncio.run(load_test(args.host, args.port, args.sessions, args.games, args.seed))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
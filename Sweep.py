@@ -0,0 +1,120 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import q_learning
+
+
+PARAMETERS = ("learning_rate", "discount_factor", "exploration_prob")
+COLUMNS = ("agent",) + PARAMETERS + ("seed", "train_games", "eval_games", "eval_opponent", "win_rate",
+                                      "average_plies", "train_seconds", "train_games_per_second", "model_size")
+
+
+def grid_configs(values):
+    return [dict(zip(PARAMETERS, combination)) for combination in itertools.product(*(values[name] for name in PARAMETERS))]
+
+
+def random_configs(values, samples, seed):
+    # Uniform over [min, max] of each parameter's listed values.
+    rng = random.Random(seed)
+    return [{name: round(rng.uniform(min(values[name]), max(values[name])), 4) for name in PARAMETERS}
+            for _ in range(samples)]
+
+
+def cell_key(cell):
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def run_cell(job):
+    # Trains a fresh agent by self-play with the cell's hyperparameters, then measures its win rate
+    # with learning and exploration switched off.
+    cell, cache_dir = job
+    path = os.path.join(cache_dir, f"{cell_key(cell)}.json")
+    if os.path.exists(path):
+        with open(path) as handle:
+            return json.load(handle)
+    board_class = q_learning.LinearQBoard if cell["agent"] == "linear" else q_learning.BreakthroughBoard
+    board = board_class(cell["learning_rate"], cell["discount_factor"], cell["exploration_prob"], headless=True)
+    training = board.simulate_games(cell["train_games"], opponent='self', seed=cell["seed"])
+    board.learning = False
+    board.exploration_prob = 0.0
+    evaluation = board.simulate_games(cell["eval_games"], opponent=cell["eval_opponent"], seed=cell["seed"] + 1)
+    result = dict(cell)
+    result.update({
+        "win_rate": evaluation["wins"][board.ai_piece] / evaluation["games"],
+        "average_plies": evaluation["plies"] / evaluation["games"],
+        "train_seconds": training["seconds"],
+        "train_games_per_second": training["games_per_second"],
+        "model_size": len(board.weights) if cell["agent"] == "linear" else len(board.q_table),
+    })
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as handle:
+        json.dump(result, handle)
+    os.replace(temporary_path, path)
+    return result
+
+
+def parse_values(text):
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sensitivity sweep for the Q-Learning agent.")
+    parser.add_argument("--learning-rate", type=parse_values, default=[0.05, 0.1, 0.2])
+    parser.add_argument("--discount-factor", type=parse_values, default=[0.8, 0.9, 0.99])
+    parser.add_argument("--exploration-prob", type=parse_values, default=[0.05, 0.1, 0.2])
+    parser.add_argument("--random", type=int, default=0,
+                        help="sample this many configurations from the value ranges instead of the full grid")
+    parser.add_argument("--seeds", type=lambda text: [int(value) for value in text.split(",")], default=[0, 1, 2])
+    parser.add_argument("--agent", choices=("tabular", "linear"), default="tabular")
+    parser.add_argument("--train-games", type=int, default=500)
+    parser.add_argument("--eval-games", type=int, default=200)
+    parser.add_argument("--eval-opponent", choices=("random", "self"), default="random")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default="sweep_cache")
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    values = {"learning_rate": args.learning_rate, "discount_factor": args.discount_factor,
+              "exploration_prob": args.exploration_prob}
+    configs = random_configs(values, args.random, args.seeds[0]) if args.random else grid_configs(values)
+    cells = [dict(config, agent=args.agent, seed=seed, train_games=args.train_games, eval_games=args.eval_games,
+                  eval_opponent=args.eval_opponent)
+             for config in configs for seed in args.seeds]
+    os.makedirs(args.cache_dir, exist_ok=True)
+    cached = sum(os.path.exists(os.path.join(args.cache_dir, f"{cell_key(cell)}.json")) for cell in cells)
+    print(f"{len(cells)} cells, {cached} cached", file=sys.stderr)
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(args.workers) as pool:
+        for result in pool.imap_unordered(run_cell, [(cell, args.cache_dir) for cell in cells]):
+            results.append(result)
+            print(f"[{len(results)}/{len(cells)}] " + ", ".join(f"{name}={result[name]}" for name in PARAMETERS)
+                  + f", seed={result['seed']}: win rate {result['win_rate']:.3f}", file=sys.stderr)
+    results.sort(key=lambda result: tuple(result[name] for name in PARAMETERS) + (result["seed"],))
+
+    with open(args.output, "w", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=COLUMNS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({column: result[column] for column in COLUMNS})
+
+    print(f"{'learning_rate':>14} {'discount_factor':>16} {'exploration_prob':>17} {'win_rate':>9} {'stdev':>7}")
+    for config, group in itertools.groupby(results, key=lambda result: tuple(result[name] for name in PARAMETERS)):
+        rates = [result["win_rate"] for result in group]
+        mean = sum(rates) / len(rates)
+        stdev = (sum((rate - mean) ** 2 for rate in rates) / (len(rates) - 1)) ** 0.5 if len(rates) > 1 else 0.0
+        print(f"{config[0]:>14} {config[1]:>16} {config[2]:>17} {mean:>9.3f} {stdev:>7.3f}")
+    print(f"wrote {len(results)} rows to {args.output} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
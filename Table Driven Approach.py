@@ -2,6 +2,60 @@ import random
 import sys
 sys.tracebacklimit = 0
 
+SQUARE_NAMES = [chr(col + ord('a')) + str(row + 1) for row in range(8) for col in range(8)]
+
+
+def build_move_tables(piece):
+    # Per square (row * 8 + col), for one side: the square one step forward, the diagonal capture
+    # squares (towards col + 1 first), the two-square target with the square it passes over, and
+    # the en passant capture squares. None or () where a pawn there cannot make that move.
+    step = 8 if piece == 'P' else -8
+    start_rows = (0, 1) if piece == 'P' else (6, 7)
+    en_passant_row = 3 if piece == 'P' else 4
+    forward, captures, double_steps, en_passant = [], [], [], []
+    for square in range(64):
+        row, col = square >> 3, square & 7
+        target = square + step
+        on_board = 0 <= target < 64
+        sides = [offset for offset, edge in ((1, 7), (-1, 0)) if col != edge]
+        forward.append(target if on_board else None)
+        captures.append(tuple(target + offset for offset in sides) if on_board else ())
+        double_steps.append((target + step, target) if row in start_rows else None)
+        en_passant.append(tuple(square - step + offset for offset in sides) if row == en_passant_row else ())
+    return forward, captures, double_steps, en_passant
+
+
+MOVE_TABLES = {piece: build_move_tables(piece) for piece in ('P', 'p')}
+
+# One bit per percept that determine_action can see; ai_make_move computes them once per turn,
+# adding only the two-square bit per candidate move.
+PERCEPT_BITS = {
+    "AI's Turn": 1,
+    "Positions of AI's Pawns Closest to Opponent's Home Row": 2,
+    "Positions of Player's Pawns Closest to AI's Home Row": 4,
+    "Available Legal Moves for AI": 8,
+    "Forward Movement Only": 16,
+    "Two-Square First Move": 32,
+    "Current Position of All Pieces": 64,
+    "Whose Turn It Is": 128,
+}
+AI_PAWNS_PERCEPT = "Positions of AI's Pawns Closest to Opponent's Home Row"
+
+
+def compile_strategy_table(strategy_table):
+    # A list indexed by percept bitmask giving the action the table walk picks. An entry only
+    # fires under the AI pawn positions percept (all 16 home squares are always reported), so
+    # entries filed under any other percept compile to nothing.
+    rules = []
+    for percept_key, strategy in strategy_table.items():
+        if percept_key != AI_PAWNS_PERCEPT:
+            continue
+        for strategy_key, action in strategy.items():
+            if strategy_key in PERCEPT_BITS:
+                rules.append((PERCEPT_BITS[percept_key] | PERCEPT_BITS[strategy_key], action))
+    return [next((action for mask, action in rules if percepts & mask == mask), "Default Action")
+            for percepts in range(1 << len(PERCEPT_BITS))]
+
 class BreakthroughBoard:
     def __init__(self):
         self.board = [['.' for _ in range(8)] for _ in range(8)]
@@ -37,6 +91,15 @@ class BreakthroughBoard:
                 "Whose Turn It Is": "Action: Focus on reaching the other end of the board quickly for a win",
             },
         }
+        self.decision_index = compile_strategy_table(self.strategy_table)
+        self.action_handlers = {
+            "Action: Move pawn closer to opponent's home row": self.play_move,
+            "Action: Move to capture opponent's pawn if possible": self.capture_toward_pawn,
+            "Action: Move to block and capture the player's pawn if it's near rows 4 or 5": self.block_move,
+            "Action: Use two-square move option on the first move if available": self.two_square_move,
+            "Action: Consider en passant move if applicable": self.en_passant_move,
+            "Action: Focus on reaching the other end of the board quickly for a win": self.endgame_move,
+        }
         
     def initialize_board(self):
         for i in range(8):
@@ -101,37 +164,24 @@ class BreakthroughBoard:
     
     def is_valid_move(self, from_x, from_y, to_x, to_y, piece):
         if to_x < 0 or to_x >= 8 or to_y < 0 or to_y >= 8:
-            return False 
-
+            return False
         if piece.islower():
-            if from_x - to_x == 1 and from_y == to_y and self.board[to_x][to_y] == '.':
-                return True
-            if from_x - to_x == 2 and from_y == to_y and from_x == 6 and to_x == 4 and self.board[to_x][to_y] == '.' and self.board[to_x + 1][to_y] == '.':
-                return True
-            elif from_x - to_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].isupper():
-                return True
-
-            if from_x - to_x == 2 and from_y == to_y and from_x == 7 and to_x == 5 and self.board[to_x][to_y] == '.' and self.board[to_x + 1][to_y] == '.':
-                return True
-            elif from_x - to_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].isupper():
-                return True
-            if from_x == 4 and to_x == 5 and abs(from_y - to_y) == 1 and self.en_passant_target == self.coordinates_to_square(5, to_y):
-                return True
-            
+            forward, captures, double_steps, en_passant = MOVE_TABLES['p']
         elif piece.isupper():
-            if to_x - from_x == 1 and from_y == to_y and self.board[to_x][to_y] == '.':
-                return True
-            if to_x - from_x == 2 and from_y == to_y and from_x == 1 and to_x == 3 and self.board[to_x][to_y] == '.' and self.board[to_x - 1][to_y] == '.':
-                return True
-            elif to_x - from_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].islower():
-                return True
-            if to_x - from_x == 2 and from_y == to_y and from_x == 0 and to_x == 2 and self.board[to_x][to_y] == '.' and self.board[to_x - 1][to_y] == '.':
-                return True
-            elif to_x - from_x == 1 and abs(from_y - to_y) == 1 and self.board[to_x][to_y].islower():
-                return True
-            if from_x == 3 and to_x == 2 and abs(from_y - to_y) == 1 and self.en_passant_target == self.coordinates_to_square(2, to_y):
-                return True
-        return False
+            forward, captures, double_steps, en_passant = MOVE_TABLES['P']
+        else:
+            return False
+        move_from, move_to = from_x * 8 + from_y, to_x * 8 + to_y
+        target = self.board[to_x][to_y]
+        if move_to == forward[move_from]:
+            return target == '.'
+        if move_to in captures[move_from]:
+            return target.isupper() if piece.islower() else target.islower()
+        double_step = double_steps[move_from]
+        if double_step is not None and move_to == double_step[0]:
+            middle = double_step[1]
+            return target == '.' and self.board[middle >> 3][middle & 7] == '.'
+        return move_to in en_passant[move_from] and self.en_passant_target == SQUARE_NAMES[move_to]
 
     def display_en_passant_target(self):
         if self.en_passant_target:
@@ -151,79 +201,74 @@ class BreakthroughBoard:
         return True
 
     def ai_make_move(self):
-        valid_moves = self.get_valid_moves()
-        for move in valid_moves:
-            move_from_x, move_from_y = self.square_to_coordinates(move[0])
-            move_to_x, move_to_y = self.square_to_coordinates(move[1])
-            if move_from_x == 6 and move_to_x == 5 and abs(move_from_y - move_to_y) == 1:
-                self.make_move(move[0], move[1])
+        moves = self.valid_move_indices()
+        for move_from, move_to in moves:
+            if move_from >> 3 == 6 and move_to >> 3 == 5 and move_to != move_from - 8:
+                self.make_move(SQUARE_NAMES[move_from], SQUARE_NAMES[move_to])
                 return
-        for i, move in enumerate(valid_moves):
-            move_from, move_to = move
-            move_from_x, move_from_y = self.square_to_coordinates(move_from)
-            move_to_x, move_to_y = self.square_to_coordinates(move_to)
-            percepts = {
-                "AI's Turn": True if self.current_player == self.ai_piece else False,
-                "Positions of AI's Pawns Closest to Opponent's Home Row": [(6, 0), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), (6, 6), (6, 7), 
-                                                                           (7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7)],
-                "Positions of Player's Pawns Closest to AI's Home Row": self.find_closest_pawns()[1],
-                "Available Legal Moves for AI": valid_moves,
-                "Forward Movement Only": True,  # As pawns only move forward
-                "Two-Square First Move": True if self.player_moves <= 2 and move_from_x in [6, 7] else False,
-                "Current Position of All Pieces": self.board,
-                "Whose Turn It Is": self.current_player,
-            }
-            action = self.determine_action(percepts)
-            if action == "Action: Move pawn closer to opponent's home row":
-                self.make_move(move_from, move_to)
+        turn_percepts = self.turn_percepts(moves)
+        for move_from, move_to in moves:
+            percepts = turn_percepts
+            if self.player_moves <= 2 and move_from >> 3 in [6, 7]:
+                percepts |= PERCEPT_BITS["Two-Square First Move"]
+            handler = self.action_handlers.get(self.determine_action(percepts))
+            if handler is not None and handler(move_from, move_to):
                 return
-            if action == "Action: Move to capture opponent's pawn if possible":
-                target_x, target_y = self.find_best_opponent_pawn_capture(move_to_x, move_to_y)
-                if target_x is not None and target_y is not None:
-                    target_square = self.coordinates_to_square(target_x, target_y)
-                    self.make_move(move_from, target_square)
-                    return
-            if action == "Action: Move to block and capture the player's pawn if it's near rows 4 or 5":
-                player_pawns_near_middle = any((row in [3, 4] for row, _ in self.find_closest_pawns()[1]))
-                if player_pawns_near_middle:
-                    self.make_move(move_from, move_to)
-                    return
-            if action == "Action: Use two-square move option on the first move if available":
-                if self.player_moves <= 2 and move_from_x in [6, 7]:
-                    self.make_move(move_from, move_to)
-                    return
-            if action == "Action: Consider en passant move if applicable":
-                en_passant_target_square = self.check_en_passant(move_to_x, move_to_y)
-                if en_passant_target_square:
-                    self.make_move(move_from, en_passant_target_square)
-                    return
-            if action == "Action: Focus on reaching the other end of the board quickly for a win":
-                if self.player_moves >= 60:
-                    self.make_move(move_from, move_to)
-                    return
-            move_to_make = move_to
-        if move_to_make is not None:
-            self.make_move(move_from, move_to_make)
+        if moves:
+            move_from, move_to = moves[-1]
+            self.make_move(SQUARE_NAMES[move_from], SQUARE_NAMES[move_to])
         else:
             default_action = "Action: Move pawn closer to opponent's home row"
             print(f"No specific action taken. Using default action: {default_action}")
 
+    def turn_percepts(self, moves):
+        percepts = PERCEPT_BITS[AI_PAWNS_PERCEPT] | PERCEPT_BITS["Forward Movement Only"]
+        percepts |= PERCEPT_BITS["Current Position of All Pieces"] | PERCEPT_BITS["Whose Turn It Is"]
+        if self.current_player == self.ai_piece:
+            percepts |= PERCEPT_BITS["AI's Turn"]
+        if 'p' in self.board[7]:
+            percepts |= PERCEPT_BITS["Positions of Player's Pawns Closest to AI's Home Row"]
+        if moves:
+            percepts |= PERCEPT_BITS["Available Legal Moves for AI"]
+        return percepts
+
     def determine_action(self, percepts):
-        for percept_key in self.strategy_table:
-            if percepts.get(percept_key, False):
-                strategy = self.strategy_table[percept_key]
-                for strategy_key in strategy:
-                    if strategy_key in percepts and percepts[strategy_key]:
-                        if percept_key == "Positions of AI's Pawns Closest to Opponent's Home Row":
-                            all_closest_pawns_in_position = all(coord in percepts[percept_key] for coord in [(6, 0), (6, 1), (6, 2), (6, 3), (6, 4), (6, 5), 
-                                                                            (6, 6), (6, 7), (7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7)])
-                            if all_closest_pawns_in_position:
-                                return strategy[strategy_key]
-                            elif percept_key == "AI's Turn" and all(coord in percepts[percept_key] for coord in [(6, 0), (6, 1), (6, 2), (6, 3), (6, 4), 
-                                                                (6, 5), (6, 6), (6, 7), (7, 0), (7, 1), (7, 2), (7, 3), (7, 4), (7, 5), (7, 6), (7, 7)]):
-                                return strategy[strategy_key]
-        return "Default Action"
-    
+        return self.decision_index[percepts]
+
+    # Action handlers: each plays its move and returns True, or returns False when it does not apply.
+    def play_move(self, move_from, move_to):
+        self.make_move(SQUARE_NAMES[move_from], SQUARE_NAMES[move_to])
+        return True
+
+    def capture_toward_pawn(self, move_from, move_to):
+        target = self.find_best_opponent_pawn_capture(move_to >> 3, move_to & 7)
+        if target is None:
+            return False
+        self.make_move(SQUARE_NAMES[move_from], self.coordinates_to_square(*target))
+        return True
+
+    def block_move(self, move_from, move_to):
+        if not any((row in [3, 4] for row, _ in self.find_closest_pawns()[1])):
+            return False
+        return self.play_move(move_from, move_to)
+
+    def two_square_move(self, move_from, move_to):
+        if not (self.player_moves <= 2 and move_from >> 3 in [6, 7]):
+            return False
+        return self.play_move(move_from, move_to)
+
+    def en_passant_move(self, move_from, move_to):
+        en_passant_target_square = self.check_en_passant(move_to >> 3, move_to & 7)
+        if not en_passant_target_square:
+            return False
+        self.make_move(SQUARE_NAMES[move_from], en_passant_target_square)
+        return True
+
+    def endgame_move(self, move_from, move_to):
+        if self.player_moves < 60:
+            return False
+        return self.play_move(move_from, move_to)
+
     def find_best_opponent_pawn_capture(self, current_x, current_y):
         opponent_pawns = self.find_closest_pawns()[1]
         best_capture = None
@@ -236,20 +281,24 @@ class BreakthroughBoard:
                     best_capture_distance = distance
         return best_capture
     
+    def valid_move_indices(self):
+        # The AI's forward moves and captures as (from, to) square indices, in board order.
+        forward, captures, _, _ = MOVE_TABLES['p']
+        board = self.board
+        moves = []
+        for move_from in range(64):
+            if board[move_from >> 3][move_from & 7] != 'p':
+                continue
+            target = forward[move_from]
+            if target is not None and board[target >> 3][target & 7] == '.':
+                moves.append((move_from, target))
+            for target in captures[move_from]:
+                if board[target >> 3][target & 7].isupper():
+                    moves.append((move_from, target))
+        return moves
+
     def get_valid_moves(self):
-        valid_moves = []
-        player_piece = 'p'
-        move_direction = -1
-        for i in range(8):
-            for j in range(8):
-                if self.board[i][j] == player_piece:
-                    if self.is_valid_move(i, j, i + move_direction, j, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j)))
-                    if self.is_valid_move(i, j, i + move_direction, j + 1, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j + 1)))
-                    if self.is_valid_move(i, j, i + move_direction, j - 1, player_piece):
-                        valid_moves.append((self.coordinates_to_square(i, j), self.coordinates_to_square(i + move_direction, j - 1)))
-        return valid_moves
+        return [(SQUARE_NAMES[move_from], SQUARE_NAMES[move_to]) for move_from, move_to in self.valid_move_indices()]
 
     def coordinates_to_square(self, x, y):
         column = chr(y + ord('a'))
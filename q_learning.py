@@ -0,0 +1,13 @@
+import importlib.util
+import os
+import sys
+
+# Q-Learning.py is not an importable module name. Importing q_learning loads it once, in this
+# module's place, so the tools, the tests and their worker processes all share one engine module.
+_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Q-Learning.py")
+_spec = importlib.util.spec_from_file_location(__name__, _path)
+_module = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)
+# The game script hides tracebacks from players; code importing the engine wants them back.
+sys.tracebacklimit = 1000
@@ -0,0 +1,26 @@
+import math
+
+import numpy as np
+
+import Arena
+
+
+def test_ratings_match_the_two_agent_closed_form():
+    # With the virtual draw, 3-1 becomes 3.5-1.5, and the ratings split the log-odds evenly.
+    ratings = Arena.bradley_terry(np.array([[0.0, 3.0], [1.0, 0.0]]))
+    expected = 400 * math.log10(3.5 / 1.5) / 2
+    assert np.allclose(ratings, [expected, -expected])
+
+
+def test_intervals_contain_finite_point_estimates():
+    # "strong" never loses and "weak" never wins, which has no finite unregularized estimate.
+    wins = np.array([[0, 100, 100, 100],
+                     [0, 0, 60, 70],
+                     [0, 40, 0, 55],
+                     [0, 30, 45, 0]], dtype=float)
+    ratings, low, high = Arena.elo_with_intervals(wins, samples=300)
+    assert np.all(np.isfinite(ratings))
+    assert np.allclose(ratings, Arena.bradley_terry(wins, tolerance=1e-13))
+    assert abs(ratings.mean()) < 1e-9
+    assert np.all(low - 1e-6 <= ratings) and np.all(ratings <= high + 1e-6)
+    assert list(np.argsort(-ratings)) == [0, 1, 2, 3]
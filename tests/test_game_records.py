@@ -0,0 +1,36 @@
+import pytest
+
+import q_learning
+
+GAMES = [('P', [(9, 17), (54, 46), (17, 25)]), ('p', [(8, 24), (49, 33)]), (None, [])]
+
+
+def write_games(path):
+    writer = q_learning.GameRecordWriter(path)
+    for winner, moves in GAMES:
+        writer.write_game(moves, winner)
+    return writer
+
+
+def test_each_game_is_readable_as_soon_as_it_is_written(tmp_path):
+    path = str(tmp_path / "games.bin")
+    writer = write_games(path)
+    assert list(q_learning.read_game_records(path)) == GAMES
+    writer.close()
+
+
+def test_truncated_game_raises_after_the_complete_ones(tmp_path):
+    path = str(tmp_path / "games.bin")
+    write_games(path).close()
+    with open(path, "rb") as handle:
+        data = handle.read()
+    header = q_learning.GAME_RECORD_HEADER.size
+    first_game = len(q_learning.GAME_RECORD_MAGIC) + header + len(GAMES[0][1])
+    # Cut inside the second game's plies, then inside its header.
+    for end in (first_game + header + 1, first_game + 1):
+        with open(path, "wb") as handle:
+            handle.write(data[:end])
+        records = q_learning.read_game_records(path)
+        assert next(records) == GAMES[0]
+        with pytest.raises(ValueError):
+            next(records)
@@ -0,0 +1,73 @@
+import q_learning
+
+START = q_learning.BreakthroughBoard(headless=True).bitboards
+
+
+def tree_nodes(search):
+    nodes, stack = [], [search.root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(search._children(node))
+    return nodes
+
+
+def check_pool(search, max_nodes):
+    # Every node is either in the tree or on the free list, exactly once, and every expanded node
+    # holds a child for each of its moves.
+    nodes = tree_nodes(search)
+    assert sorted(nodes + search.free) == list(range(max_nodes))
+    for node in nodes:
+        children = list(search._children(node))
+        if search.expanded[node]:
+            moves = q_learning.generate_bitboard_moves(search.player_mask[node], search.ai_mask[node],
+                                                       search.side[node], search.en_passant)
+            assert [search.move[child] for child in children] == moves
+        else:
+            assert children == []
+
+
+def test_full_pool_still_gives_legal_moves():
+    search = q_learning.MonteCarloTreeSearch(playouts=120, time_limit=None, max_nodes=60, seed=3)
+    player_mask, ai_mask = START['P'], START['p']
+    piece = 'p'
+    for _ in range(4):
+        info = search.search(player_mask, ai_mask, piece)
+        assert info["nodes_in_use"] == 60 - len(search.free)
+        assert info["move"] in q_learning.generate_bitboard_moves(player_mask, ai_mask, piece)
+        check_pool(search, 60)
+        player_mask, ai_mask = q_learning.apply_bitboard_move(player_mask, ai_mask, piece, *info["move"])
+        piece = 'p' if piece == 'P' else 'P'
+
+
+def test_tree_is_kept_for_the_next_position():
+    search = q_learning.MonteCarloTreeSearch(playouts=200, time_limit=None, seed=1)
+    search.search(START['P'], START['p'], 'p')
+    ai_move = search.last_info["move"]
+    player_mask, ai_mask = q_learning.apply_bitboard_move(START['P'], START['p'], 'p', *ai_move)
+    reply = q_learning.generate_bitboard_moves(player_mask, ai_mask, 'P')[0]
+    player_mask, ai_mask = q_learning.apply_bitboard_move(player_mask, ai_mask, 'P', *reply)
+    old_root = search.root
+    kept = next(grandchild for child in search._children(old_root) if search.move[child] == ai_move
+                for grandchild in search._children(child) if search.move[grandchild] == reply)
+    visits = search.visits[kept]
+    assert visits > 0
+    search.search(player_mask, ai_mask, 'p', playouts=50)
+    assert search.root == kept
+    assert search.parent[kept] == -1
+    assert search.last_info["root_visits"] == visits + 50
+    check_pool(search, len(search.parent))
+
+
+def test_released_nodes_are_reused():
+    search = q_learning.MonteCarloTreeSearch(playouts=80, time_limit=None, max_nodes=500, seed=2)
+    search.search(START['P'], START['p'], 'p')
+    assert search.last_info["nodes_in_use"] > 1
+    # A position outside the tree releases all of it; the new tree is built from the same nodes.
+    player_mask = START['P'] & ~q_learning.ROW_MASKS[1]
+    search.search(player_mask, START['p'], 'p', playouts=0)
+    assert search.last_info["nodes_in_use"] == 1
+    check_pool(search, 500)
+    search.search(player_mask, START['p'], 'p')
+    assert search.last_info["nodes_in_use"] > 1
+    check_pool(search, 500)
@@ -0,0 +1,55 @@
+import pickle
+
+import pytest
+
+import q_learning
+
+
+def test_action_codes_are_unique_per_side():
+    # Every move one side can ever make, captures and two-square moves included, gets its own code.
+    for piece, rows in (('P', range(7)), ('p', range(1, 8))):
+        codes = {}
+        for move_from in (row * 8 + col for row in rows for col in range(8)):
+            targets = q_learning.pawn_target_mask(move_from, piece, 0, 0) | q_learning.CAPTURE_MASKS[piece][move_from]
+            for move_to in q_learning.iter_bits(targets):
+                code = q_learning.encode_action((move_from, move_to))
+                assert 0 <= code < 192
+                assert code not in codes, (piece, move_from, move_to, codes.get(code))
+                codes[code] = (move_from, move_to)
+
+
+def test_one_and_two_square_moves_round_trip(tmp_path):
+    state = q_learning.BreakthroughBoard(headless=True).get_state_representation()
+    q_table = {(state, (8, 16)): 0.25, (state, (8, 24)): -0.5, (state, (9, 18)): 1.0}
+    assert q_learning.encode_action((8, 16)) != q_learning.encode_action((8, 24))
+    assert q_learning.encode_action((48, 40)) != q_learning.encode_action((48, 32))
+    path = str(tmp_path / "qtable.bin")
+    q_learning.save_q_table(q_table, path)
+    for loaded in (q_learning.CompactQTable.load(path), q_learning.MmapQTable(path)):
+        assert len(loaded) == len(q_table)
+        for key, value in q_table.items():
+            assert loaded[key] == value
+
+
+def test_loaded_table_is_copy_on_write(tmp_path):
+    q_table = {(state, (8, 16)): float(state) for state in range(1, 50)}
+    path = str(tmp_path / "qtable.bin")
+    q_learning.save_q_table(q_table, path)
+    with open(path, "rb") as handle:
+        saved = handle.read()
+    loaded = q_learning.CompactQTable.load(path)
+    assert isinstance(loaded, q_learning.MmapQTable)
+    loaded[(1, (8, 16))] = -1.0
+    for state in range(50, 200):
+        loaded[(state, (9, 17))] = 0.5
+    assert loaded[(1, (8, 16))] == -1.0
+    assert loaded[(49, (8, 16))] == 49.0
+    assert len(loaded) == 49 + 150
+    with open(path, "rb") as handle:
+        assert handle.read() == saved
+    copied = pickle.loads(pickle.dumps(loaded))
+    assert copied[(1, (8, 16))] == -1.0 and len(copied) == len(loaded)
+    read_only = q_learning.MmapQTable(path)
+    assert read_only[(1, (8, 16))] == 1.0
+    with pytest.raises(TypeError):
+        read_only[(1, (8, 16))] = 0.0
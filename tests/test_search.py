@@ -0,0 +1,61 @@
+import numpy as np
+
+import q_learning
+
+
+def blocked_board():
+    board = q_learning.BreakthroughBoard(headless=True)
+    board.board = [['.'] * 8 for _ in range(8)]
+    board.board[0][0] = 'P'
+    board.board[1][0] = 'p'
+    board.board[7][7] = 'p'
+    board.sync_board()
+    board.current_player = 'P'
+    board.en_passant_target = None
+    return board
+
+
+def test_search_agents_return_none_without_legal_moves():
+    agents = [
+        q_learning.AlphaBetaSearch(time_limit=0.1, tt_megabytes=1),
+        q_learning.LazySMPSearch(workers=2, time_limit=0.1, tt_megabytes=1),
+        q_learning.MonteCarloTreeSearch(playouts=50, time_limit=None, seed=1),
+    ]
+    board = blocked_board()
+    assert board.get_legal_moves('P') == []
+    for agent in agents:
+        assert agent.choose_move(board) is None
+
+
+def test_shared_tables_use_one_generation():
+    keys, data = np.zeros(64, dtype=np.uint64), np.zeros(64, dtype=np.uint64)
+    generation = np.ones(1, dtype=np.uint64)
+    main = q_learning.TranspositionTable(keys=keys, data=data, generation=generation)
+    helpers = [q_learning.TranspositionTable(keys=keys, data=data, generation=generation) for _ in range(3)]
+    for _ in range(300):
+        main.advance_generation()
+        for table in [main] + helpers:
+            table.new_search()
+        assert len({table.generation for table in [main] + helpers}) == 1
+        assert 1 <= main.generation <= 255
+    main.store(5, 3, 10, q_learning.TranspositionTable.EXACT, (8, 16))
+    assert helpers[0].probe(5) == (10, 3, q_learning.TranspositionTable.EXACT, (8, 16))
+
+
+def test_ai_turn_without_legal_moves_ends_the_game():
+    # The AI's only pawn on h8 is blocked by the player's pawn on h7 and has nothing to capture.
+    agents = [None, q_learning.AlphaBetaSearch(time_limit=0.1, tt_megabytes=1),
+              q_learning.MonteCarloTreeSearch(playouts=50, time_limit=None, seed=1)]
+    for agent in agents:
+        board = q_learning.BreakthroughBoard(headless=True, ai_agent=agent)
+        board.board = [['.'] * 8 for _ in range(8)]
+        board.board[7][7] = 'p'
+        board.board[6][7] = 'P'
+        board.board[0][0] = 'P'
+        board.sync_board()
+        board.current_player = 'p'
+        board.en_passant_target = None
+        assert board.get_legal_moves('p') == []
+        assert board.take_ai_turn() is False
+        assert board.current_player == 'p'
+        assert board.ai_move_history == []
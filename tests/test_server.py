@@ -0,0 +1,47 @@
+import asyncio
+import signal
+import socket
+import subprocess
+import sys
+
+import Server as server_module
+
+
+async def exchange(lines):
+    game_server = server_module.GameServer()
+    server = await asyncio.start_server(game_server.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    replies = [(await reader.readline()).decode().strip()]
+    for line in lines:
+        writer.write(f"{line}\n".encode())
+        replies.append((await reader.readline()).decode().strip())
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    game_server.executor.shutdown()
+    return replies
+
+
+def test_move_must_be_legal_for_player():
+    replies = asyncio.run(exchange(["MOVE d7 d6", "MOVE a2 a5", "MOVE e3 e4", "MOVE d2 d3"]))
+    assert replies[0].startswith("READY")
+    assert replies[1:4] == ["ERR invalid move"] * 3
+    assert replies[4].split()[0] == "OK"
+
+
+def test_sigterm_keeps_every_finished_game(tmp_path):
+    record = str(tmp_path / "games.bin")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, server_module.__file__, "serve", "--port", str(port),
+                                "--record", record], stderr=subprocess.PIPE)
+    try:
+        process.stderr.readline()
+        asyncio.run(server_module.play_client("127.0.0.1", port, 3, 0, []))
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+    assert process.returncode == 0
+    assert len(list(server_module.q_learning.read_game_records(record))) == 3